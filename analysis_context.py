@@ -0,0 +1,164 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+# Columns used to tell datasets apart. Hashing only these is much cheaper than hashing titles too.
+FINGERPRINT_COLUMNS = ["video_id", "published_at", "category_name_gpt", "views", "likes", "comments", "duration"]
+# Filters a context can apply, in the order they are applied (same order as main.py).
+FILTERS = ("since_year", "top_categories", "views_over", "likes_over", "comments_over")
+CACHE_SIZE = 64
+
+# Aggregates shared by every context, keyed by (dataset fingerprint, filter spec, aggregate name).
+# Least recently used entries are dropped once there are more than CACHE_SIZE.
+_AGGREGATE_CACHE: "OrderedDict[Tuple[str, tuple, str], Any]" = OrderedDict()
+
+
+def dataframe_fingerprint(dataframe: pd.DataFrame) -> str:
+    """Hash of the rows of a DataFrame (key columns only), so the same data always gets the same cache entries."""
+    columns = [column for column in FINGERPRINT_COLUMNS if column in dataframe.columns]
+    row_hashes = pd.util.hash_pandas_object(dataframe[columns], index=False).to_numpy()
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()
+
+def month_end(published_at: pd.Series) -> pd.Series:
+    """Month end label of every date, the same bins and labels resample('ME') uses."""
+    if not pd.api.types.is_datetime64_any_dtype(published_at):
+        published_at = pd.to_datetime(published_at)  # Ensure datetime format
+    # Rolling every date forward to its month end gives the same bins as resample('ME').
+    return (published_at.dt.normalize() + pd.offsets.MonthEnd(0)).rename('published_at')
+
+def clear_cache() -> None:
+    _AGGREGATE_CACHE.clear()
+
+
+class AnalysisContext:
+    """
+    Wraps the loaded DataFrame for the analysis functions, so they do not each copy it and parse published_at again.
+    Derived columns (datetime, year, month, duration minutes) are computed once, the first time a function asks for them.
+    Common aggregates (monthly cube, videos per year, videos per category) are computed once and kept in a small LRU cache
+    keyed by the dataset fingerprint and the filters, which is shared between contexts of the same data.
+    With shared=False (the throwaway contexts of()) aggregates are only kept by the context itself,
+    so the data is never hashed for a context that is used once.
+    Results are shared, so they must not be modified by the caller.
+    """
+    def __init__(self, dataframe: pd.DataFrame, filter_spec: Tuple[Tuple[str, Any], ...] = (), fingerprint: Optional[str] = None,
+                 shared: bool = True):
+        self.dataframe = dataframe
+        self.filter_spec = filter_spec
+        self.shared = shared
+        self._fingerprint = fingerprint
+        self._columns: Dict[str, pd.Series] = {}
+        self._aggregates: Dict[str, Any] = {}
+
+    @classmethod
+    def of(cls, data: Union[pd.DataFrame, "AnalysisContext"]) -> "AnalysisContext":
+        """
+        Returns data itself if it is already a context, otherwise a new context around the DataFrame.
+        That context does not use the shared cache: hashing the data would often cost more than the one aggregate asked for.
+        """
+        return data if isinstance(data, cls) else cls(data, shared=False)
+
+    @property
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            self._fingerprint = dataframe_fingerprint(self.dataframe)
+        return self._fingerprint
+
+    def __len__(self) -> int:
+        return len(self.dataframe)
+
+    def _column(self, name: str, compute: Callable[[], pd.Series]) -> pd.Series:
+        if name not in self._columns:
+            self._columns[name] = compute()
+        return self._columns[name]
+
+    def published_at(self) -> pd.Series:
+        """published_at as datetime (parsed only if the loader did not already)."""
+        def compute() -> pd.Series:
+            published_at = self.dataframe['published_at']
+            return published_at if pd.api.types.is_datetime64_any_dtype(published_at) else pd.to_datetime(published_at)
+        return self._column('published_at', compute)
+
+    def year(self) -> pd.Series:
+        return self._column('year', lambda: self.published_at().dt.year.rename('year'))
+
+    def month(self) -> pd.Series:
+        """Month end of every video, the same labels resample('ME') gives."""
+        return self._column('month', lambda: month_end(self.published_at()))
+
+    def duration_minutes(self) -> pd.Series:
+        def compute() -> pd.Series:
+            if 'duration_minutes' in self.dataframe.columns:
+                return self.dataframe['duration_minutes']
+            from durations import parse_durations
+            return parse_durations(self.dataframe['duration'])['duration_minutes']
+        return self._column('duration_minutes', compute)
+
+    def cached(self, name: str, compute: Callable[[], Any]) -> Any:
+        """Returns the aggregate `name` of this dataset and filters, computing it only if it is not in the cache."""
+        if not self.shared:
+            if name not in self._aggregates:
+                self._aggregates[name] = compute()
+            return self._aggregates[name]
+        key = (self.fingerprint, self.filter_spec, name)
+        if key in _AGGREGATE_CACHE:
+            _AGGREGATE_CACHE.move_to_end(key)
+            return _AGGREGATE_CACHE[key]
+        value = compute()
+        _AGGREGATE_CACHE[key] = value
+        if len(_AGGREGATE_CACHE) > CACHE_SIZE:
+            _AGGREGATE_CACHE.popitem(last=False)
+        return value
+
+    def monthly_cube(self) -> pd.DataFrame:
+        """The (category x month) cube of data_analysis_time_series.monthly_category_cube."""
+        from data_analysis_time_series import monthly_category_cube
+        def compute() -> pd.DataFrame:
+            frame = self.dataframe
+            if 'duration_minutes' not in frame.columns and 'duration' in frame.columns:
+                frame = frame.assign(duration_minutes=self.duration_minutes())
+            return monthly_category_cube(frame, months=self.month())
+        return self.cached('monthly_cube', compute)
+
+    def yearly_counts(self) -> pd.Series:
+        """Number of videos per year, in chronological order."""
+        return self.cached('yearly_counts', lambda: self.year().value_counts().sort_index())
+
+    def category_counts(self) -> pd.Series:
+        """Number of videos per category, most videos first."""
+        def compute() -> pd.Series:
+            counts = self.dataframe['category_name_gpt'].value_counts()
+            return counts[counts > 0]  # Categorical columns also count categories that were filtered out
+        return self.cached('category_counts', compute)
+
+    @instrumented
+    def filter(self, **spec: Hashable) -> "AnalysisContext":
+        """
+        A new context with the rows kept by the filters of main.py:
+        since_year (published in or after), top_categories (most occuring N categories),
+        views_over, likes_over, comments_over (strictly greater than).
+        The new context shares the fingerprint of this one, so the data is not hashed again (and the cache only if this one does).
+        """
+        unknown = set(spec) - set(FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown filters: {sorted(unknown)}. Use {FILTERS}.")
+        df = self.dataframe
+        keep = np.ones(len(df), dtype=bool)
+        if spec.get('since_year') is not None:
+            keep &= (self.year() >= spec['since_year']).to_numpy()
+        if spec.get('top_categories') is not None:
+            counts = df['category_name_gpt'][keep].value_counts()
+            keep &= df['category_name_gpt'].isin(counts.head(spec['top_categories']).index).to_numpy()
+        for name in ('views', 'likes', 'comments'):
+            if spec.get(f'{name}_over') is not None:
+                keep &= (df[name] > spec[f'{name}_over']).to_numpy()
+        filtered = df[keep]
+        if isinstance(filtered['category_name_gpt'].dtype, pd.CategoricalDtype):
+            filtered = filtered.assign(category_name_gpt=filtered['category_name_gpt'].cat.remove_unused_categories())
+        context = AnalysisContext(filtered, self.filter_spec + tuple((name, spec[name]) for name in FILTERS if name in spec),
+                                  self.fingerprint if self.shared else None, self.shared)
+        # Derived columns are reused for the kept rows instead of computed again.
+        context._columns = {name: column[keep] for name, column in self._columns.items()}
+        return context
@@ -0,0 +1,205 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from durations import format_durations
+
+# YouTube category names used for synthetic data, the same ones that appear in pewdiepie_videos_gpt.csv.
+CATEGORY_NAMES = ["Entertainment", "Gaming", "People & Blogs", "Comedy", "Autos & Vehicles", "Howto & Style", "Film & Animation",
+                  "Music", "News & Politics", "Nonprofits & Activism", "Education", "Science & Technology", "Sports"]
+CATEGORY_IDS = [24, 20, 22, 23, 2, 26, 1, 10, 25, 29, 27, 28, 17]
+
+
+def _category_names(categories: int) -> List[str]:
+    return CATEGORY_NAMES[:categories] + [f"Category {i}" for i in range(len(CATEGORY_NAMES), categories)]
+
+def synthetic_videos(rows: int, categories: int = 13, seed: int = 0) -> pd.DataFrame:
+    """
+    A synthetic video table shaped like pewdiepie_videos_gpt.csv (same columns and formats):
+    uploads spread over 2010-2025, category_name_gpt skewed towards a few categories (Zipf like),
+    lognormal video lengths, heavily skewed (lognormal) views, and likes and comments as a small share of views.
+    """
+    rng = np.random.default_rng(seed)
+    names = _category_names(categories)
+    ids = (CATEGORY_IDS + list(range(100, 100 + categories)))[:categories]
+
+    # A few categories hold most of the videos, like Entertainment and Gaming in the real data.
+    category_weights = 1 / np.arange(1, categories + 1) ** 1.2
+    gpt_category = rng.choice(categories, size=rows, p=category_weights / category_weights.sum())
+    youtube_category = np.where(rng.random(rows) < 0.7, gpt_category, rng.choice(categories, size=rows))
+
+    start, end = np.datetime64("2010-06-01T00:00:00"), np.datetime64("2025-03-15T00:00:00")
+    published_at = start + rng.integers(0, int((end - start).astype(np.int64)), size=rows).astype("timedelta64[s]")
+    duration_seconds = np.clip(rng.lognormal(np.log(600), 0.8, size=rows), 0, 6 * 3600).astype(np.int64)
+    duration_seconds[rng.random(rows) < 0.001] = 0  # Live streams without a length
+    views = rng.lognormal(np.log(2_000_000), 1.3, size=rows).astype(np.int64)
+    views[rng.random(rows) < 0.005] = 0  # Premium videos have no public statistics
+    likes = (views * rng.beta(2, 40, size=rows)).astype(np.int64)
+    comments = (views * rng.beta(1.2, 300, size=rows)).astype(np.int64)
+
+    return pd.DataFrame({
+        "video_id": np.char.mod("%011x", np.arange(rows) * 2654435761 % (16 ** 11)),
+        "title": np.char.add("Synthetic video ", np.arange(rows).astype(str)),
+        "published_at": np.char.add(np.datetime_as_string(published_at, unit="s"), "Z"),
+        "category_id": np.asarray(ids)[youtube_category],
+        "duration": format_durations(duration_seconds),
+        "views": views,
+        "likes": likes,
+        "comments": comments,
+        "category_name": np.asarray(names)[youtube_category],
+        "category_name_gpt": np.asarray(names)[gpt_category],
+    })
+
+def measure(function: Callable[[], Any], repeat: int = 3, setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """
+    Wall time of `repeat` runs (min and median), then one more run under tracemalloc for the peak memory it allocates.
+    Timing runs are not traced, tracemalloc slows Python code down.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds_min": min(timings), "seconds_median": statistics.median(timings), "peak_memory_bytes": peak}
+
+def _main_py_load(path: str) -> pd.DataFrame:
+    """CSV load and numeric casting as main.py did it before the typed loader."""
+    df = pd.read_csv(path, encoding="utf-8")
+    for column in ("views", "likes", "comments"):
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    return df
+
+def benchmark_cases(csv_path: str, output_dir: str) -> Dict[str, tuple]:
+    """Every hot path to measure: name -> (function, setup run before every measured call)."""
+    import matplotlib
+    matplotlib.use("Agg", force=True)
+    import analysis_context
+    import data_analysis_time_series as time_series
+    import durations
+    from data_analysis_barcharts import number_of_videos_per_year
+    from descriptive_analysis import total_descriptive_analysis
+    from loader import load_videos, read_videos_csv
+
+    videos = read_videos_csv(csv_path)
+    raw_durations = pd.Series(videos["duration"].to_numpy(dtype=object))
+
+    def cold_cache() -> None:
+        # Every measured run starts without memoized aggregates or parsed durations.
+        analysis_context.clear_cache()
+        durations._DURATION_SECONDS_CACHE.clear()
+
+    def quiet(function: Callable[[], Any]) -> Callable[[], Any]:
+        def run() -> Any:
+            with contextlib.redirect_stdout(io.StringIO()):
+                return function()
+        return run
+
+    def plot(function: Callable[..., None], name: str) -> Callable[[], None]:
+        return lambda: function(videos, output_path=os.path.join(output_dir, f"{name}.png"))
+
+    cases = {
+        "csv_load_to_numeric": (lambda: _main_py_load(csv_path), None),
+        "load_videos_csv": (lambda: load_videos(csv_path, use_cache=False), cold_cache),
+        "load_videos_sidecar": (lambda: load_videos(csv_path, cache_dir=output_dir), None),
+        "parse_duration_to_minutes_apply": (lambda: raw_durations.apply(durations.parse_duration_to_minutes), cold_cache),
+        "parse_durations_batch": (lambda: durations.parse_durations(raw_durations), cold_cache),
+        "monthly_category_cube": (lambda: time_series.monthly_category_cube(videos), cold_cache),
+        "number_of_videos_per_year": (plot(number_of_videos_per_year, "number_of_videos_per_year"), cold_cache),
+        "total_descriptive_analysis": (quiet(lambda: total_descriptive_analysis(videos[(videos["views"] > 0) & (videos["likes"] > 0) & (videos["comments"] > 100)])), cold_cache),
+    }
+    for name in ("category_views_gpt", "monthly_video_upload_count_category_gpt", "monthly_video_length_sum_category_gpt",
+                 "monthly_likes_sum_category_gpt", "monthly_comments_sum_category_gpt"):
+        cases[name] = (plot(getattr(time_series, name), name), cold_cache)
+    return cases
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(sizes: Sequence[int] = (10_000, 100_000), categories: int = 13, repeat: int = 3,
+                   only: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Runs every case on synthetic tables of each size and returns the results in a JSON friendly dictionary."""
+    results = []
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as output_dir:
+            csv_path = os.path.join(output_dir, "videos.csv")
+            synthetic_videos(rows, categories).to_csv(csv_path, index=False, encoding="utf-8")
+            for name, (function, setup) in benchmark_cases(csv_path, output_dir).items():
+                if only and name not in only:
+                    continue
+                result = {"name": name, "rows": rows, "categories": categories, **measure(function, repeat, setup)}
+                print(f"{name:<42} {rows:>10,} rows  {result['seconds_median']:8.3f} s  {result['peak_memory_bytes'] / 2 ** 20:9.1f} MiB")
+                results.append(result)
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 1.2) -> List[str]:
+    """Cases that got slower or use more memory than `threshold` times the baseline (same name and rows)."""
+    previous = {(result["name"], result["rows"]): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get((result["name"], result["rows"]))
+        if before is None:
+            continue
+        for key in ("seconds_median", "peak_memory_bytes"):
+            if before[key] > 0 and result[key] / before[key] > threshold:
+                regressions.append(f"{result['name']} ({result['rows']:,} rows): {key} {before[key]:.4g} -> {result[key]:.4g}")
+    return regressions
+
+
+if __name__ == "__main__":
+    """
+    python benchmark.py --rows 10000 1000000 --output benchmark_results.json --baseline previous_results.json
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the analysis hot paths on synthetic video tables.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000], help="table sizes (10k to 10M)")
+    parser.add_argument("--categories", type=int, default=13)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="names of the cases to run (default: all)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.rows, args.categories, args.repeat, args.only)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare_results(json.load(file), report, args.threshold)
+        print("\n".join(["Regressions:"] + regressions) if regressions else "No regressions.")
+        if regressions:
+            raise SystemExit(1)
@@ -1,50 +1,62 @@
 import pandas as pd
-from typing import List, Dict, Any
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
+from typing import Optional, Union
+from analysis_context import AnalysisContext
+from instrumentation import instrumented
+from rendering import finish_figure
 
 
-def number_of_videos_per_category_gpt(dataframe: pd.DataFrame) -> None:
+@instrumented
+def number_of_videos_per_category_gpt(dataframe: Union[pd.DataFrame, AnalysisContext], category_counts: Optional[pd.Series] = None,
+                                      output_path: Optional[str] = None) -> None:
     """
     Creates a bar plot for each video category and shows how many videos uploaded.
+    category_counts can be given when they are already counted (dataframe is not used then),
+    and the plot is saved to output_path instead of shown when it is given.
     """
-    df = dataframe.copy()
+    # Videos per category, most videos first (counted once and cached by the context).
+    if category_counts is None:
+        category_counts = AnalysisContext.of(dataframe).category_counts()
+    # Imported here so the statistics can be used without loading matplotlib and seaborn.
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     plt.figure(figsize=(12, 6))
-    sns.countplot(
-    y=df['category_name_gpt'], 
-    order=df['category_name_gpt'].value_counts().index, 
+    sns.barplot(
+    x=category_counts.to_numpy(),
+    y=category_counts.index.astype(str),
+    orient="h",
     color="royalblue"  # Single color, still clear and readable
     )
     plt.xlabel("Number of Videos")
     plt.ylabel("Category Name")
     plt.title("Number of Videos per Category")
-    plt.show()
+    finish_figure(output_path)
 
-def number_of_videos_per_year(dataframe: pd.DataFrame) -> None:
+@instrumented
+def number_of_videos_per_year(dataframe: Union[pd.DataFrame, AnalysisContext], yearly_counts: Optional[pd.Series] = None,
+                              output_path: Optional[str] = None) -> None:
     """
-    This function takes a DataFrame containing YouTube video data, extracts the year from 
+    This function takes a DataFrame containing YouTube video data (or an AnalysisContext around it), extracts the year from
     the 'published_at' column, and creates a bar chart showing the number of videos uploaded per year.
+    yearly_counts can be given when they are already counted (dataframe is not used then),
+    and the plot is saved to output_path instead of shown when it is given.
     """
-    # Create a copy of the DataFrame to avoid modifying the original data
-    df = dataframe.copy()    
-    # Convert the 'published_at' column to datetime format (if it isn't already)
-    df['published_at'] = pd.to_datetime(df['published_at'])
-    # Extract only the year from the 'published_at' datetime column
-    df['year'] = df['published_at'].dt.year
-    print(df.info())
+    # The context parses 'published_at' and extracts the year only once, without copying the DataFrame,
+    # and counts how many times each year appears (what sns.countplot() used to do), in chronological order.
+    if yearly_counts is None:
+        yearly_counts = AnalysisContext.of(dataframe).yearly_counts()
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     # Set figure size for better visualization
     plt.figure(figsize=(12, 6))
-    # Create a count plot showing the number of videos per year
-    # sns.countplot() automatically counts how many times each year appears in the column and creates a bar chart. (KEY POINT)
-    sns.countplot(
-        x=df['year'],  # X-axis: year of video publication
-        order=sorted(df['year'].unique(), reverse=False),  # Ensure years are in chronological order
+    # Create a bar plot showing the number of videos per year
+    sns.barplot(
+        x=yearly_counts.index.astype(str),  # X-axis: year of video publication
+        y=yearly_counts.to_numpy(),  # Y-axis: number of videos uploaded that year
         color="royalblue"  # Set bar color to royal blue for clarity
     )
     # Set axis labels and chart title
     plt.xlabel("Year")  # Label for the X-axis
     plt.ylabel("Number of Videos")  # Label for the Y-axis
     plt.title("Number of Videos per Year")  # Title of the plot
-    # Display the plot
-    plt.show()
\ No newline at end of file
+    # Display the plot, or save it when an output path is given
+    finish_figure(output_path)
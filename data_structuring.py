@@ -1,13 +1,127 @@
-from googleapiclient.discovery import build
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import threading
 import time
+from loader import write_json_atomic
+from record_store import VideoRecordStore
 
 # Initialize the YouTube API client
 api_key = "#"
-youtube = build('youtube', 'v3', developerKey=api_key)
 
-def get_video_categories() -> Dict[str, str]:
+def build_youtube_client() -> Any:
+    """Builds a new YouTube API client. Clients are not thread safe, so every worker thread builds its own."""
+    # Imported here so the analysis can import this module without googleapiclient installed.
+    from googleapiclient.discovery import build
+    return build('youtube', 'v3', developerKey=api_key)
+
+_youtube: Optional[Any] = None
+
+def youtube_client() -> Any:
+    """The client shared by the helpers below when none is given, built on first use instead of at import."""
+    global _youtube
+    if _youtube is None:
+        _youtube = build_youtube_client()
+    return _youtube
+
+# Rate limits and quota errors (403, 429) and server errors (5xx) are worth retrying after a while.
+RETRYABLE_STATUS = {403, 429, 500, 502, 503, 504}
+# A 403 is only a rate limit with one of these reasons. Others (forbidden, dailyLimitExceeded, quotaExceeded, ...)
+# do not recover within the retries, so they are raised right away.
+RETRYABLE_403_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+BATCH_SIZE = 50  # Maximum number of ids or results per request allowed by the API
+PUBLISHED_AT_FORMAT = "%Y-%m-%dT%H:%M:%SZ"  # How the API writes publishedAt, kept in the CSV
+
+class TokenBucket:
+    """
+    Token bucket rate limiter shared by all worker threads.
+    On average `rate` requests per second are let through, with bursts of up to `capacity` requests.
+    """
+    def __init__(self, rate: float = 5.0, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+def _error_status(error: Exception) -> Optional[int]:
+    """Returns the HTTP status of an API error (googleapiclient HttpError keeps it in error.resp.status)."""
+    status = getattr(getattr(error, "resp", None), "status", None) or getattr(error, "status_code", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+def _error_reasons(error: Exception) -> Set[str]:
+    """
+    Returns the reasons of an API error (ex: rateLimitExceeded, forbidden). googleapiclient HttpError keeps them
+    in error.error_details, and in the JSON body (error.content) as {"error": {"errors": [{"reason": ...}]}}.
+    """
+    reasons = {detail.get("reason") for detail in getattr(error, "error_details", None) or [] if isinstance(detail, dict)}
+    content = getattr(error, "content", None)
+    if content:
+        try:
+            body = json.loads(content.decode("utf-8") if isinstance(content, bytes) else content)
+            reasons.update(detail.get("reason") for detail in body.get("error", {}).get("errors", []))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    return {reason for reason in reasons if reason}
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = _error_status(error)
+    if status == 403:
+        reasons = _error_reasons(error)
+        # Without a readable reason the 403 is treated as a rate limit, like before reasons were read.
+        return not reasons or bool(reasons & RETRYABLE_403_REASONS)
+    return status in RETRYABLE_STATUS
+
+def execute_with_backoff(make_request: Callable[[], Any], rate_limiter: Optional[TokenBucket] = None, max_retries: int = 5,
+                         base_delay: float = 1.0, max_delay: float = 64.0, sleep: Callable[[float], None] = time.sleep) -> Dict[str, Any]:
+    """
+    Builds and executes a request, retrying with exponential backoff (1s, 2s, 4s, ... with jitter) on rate limit and server errors
+    and on dropped connections. Any other error (including a 403 that is not a rate limit), or the last failed retry, is raised.
+    """
+    for attempt in range(max_retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return make_request().execute()
+        except Exception as error:
+            if not _is_retryable(error) or attempt == max_retries:
+                raise
+            sleep(min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+def _read_json(path: str) -> Optional[Any]:
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def get_video_categories(client: Any = None) -> Dict[str, str]:
     """
     Fetches a dictionary mapping category IDs to category names.
 
@@ -15,7 +129,7 @@ def get_video_categories() -> Dict[str, str]:
         Dict[str, str]: A mapping of category ID to category name.
     """
     categories = {}
-    request = youtube.videoCategories().list(part="snippet", regionCode="US")
+    request = (client or youtube_client()).videoCategories().list(part="snippet", regionCode="US")
     # We are using "US" as region code to get standardized categories.
     response = request.execute()
 
@@ -24,12 +138,12 @@ def get_video_categories() -> Dict[str, str]:
 
     return categories
 
-def get_channel_id(username: str) -> str:
+def get_channel_id(username: str, client: Any = None) -> str:
     """
     This function returns channel id of the channel whose name is input as str.
     Basic request made from API.
     """
-    request = youtube.search().list(
+    request = (client or youtube_client()).search().list(
         part="snippet",
         q=username,
         type="channel",
@@ -38,94 +152,249 @@ def get_channel_id(username: str) -> str:
     response = request.execute()
     return response["items"][0]["id"]["channelId"]
 
-def get_pewdiepie_uploads_playlist(channel_id: str) -> str:
+def get_pewdiepie_uploads_playlist(channel_id: str, client: Any = None) -> str:
     """
     I make another request in here that returns me the all videos the channel uploaded in its history.
     """
-    request = youtube.channels().list(
+    request = (client or youtube_client()).channels().list(
         part="contentDetails",
         id=channel_id
     )
     response = request.execute()
     return response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
 
-def get_pewdiepie_all_video_ids(playlist_id: str) -> List[Dict[str, Any]]:
+def get_pewdiepie_all_video_ids(playlist_id: str, client: Any = None, rate_limiter: Optional[TokenBucket] = None,
+                                checkpoint_path: Optional[str] = None, known_ids: Optional[Set[str]] = None) -> List[str]:
     """
     In this function I access to the API and start pulling all video ids from the playlist.
     I store all video ids in a list and return it. Since API is maximum 50 for a page,
     I continue to make requests and append it to the list until all video ids are requested.
+    Pages have to be requested one after another (each page gives the token of the next one), so only the rate limiter
+    and backoff are used here. With checkpoint_path, the ids and next page token are saved after every page
+    and an interrupted run continues from the last saved page.
+    The uploads playlist is newest first, so with known_ids (videos already stored) paging stops at the first page
+    that reaches a known video, and only the ids before it are returned.
     """
+    client = client or youtube_client()
+    rate_limiter = rate_limiter or TokenBucket()
     video_ids = []
     next_page_token = None
 
+    checkpoint = _read_json(checkpoint_path) if checkpoint_path else None
+    if checkpoint and checkpoint.get("playlist_id") == playlist_id:
+        video_ids = checkpoint["video_ids"]
+        next_page_token = checkpoint["next_page_token"]
+        if checkpoint.get("done"):
+            return video_ids
+
     while True:
-        request = youtube.playlistItems().list(
+        response = execute_with_backoff(lambda: client.playlistItems().list(
             part="contentDetails",
             playlistId=playlist_id,
-            maxResults=50,  # Maximum allowed per request
+            maxResults=BATCH_SIZE,  # Maximum allowed per request
             pageToken=next_page_token
-        )
-        response = request.execute()
+        ), rate_limiter)
 
+        reached_known_ids = False
         for item in response["items"]:
-            video_ids.append(item["contentDetails"]["videoId"])
+            video_id = item["contentDetails"]["videoId"]
+            if known_ids is not None and video_id in known_ids:
+                # Everything after the first known video is older, so it is already stored too.
+                reached_known_ids = True
+                break
+            video_ids.append(video_id)
 
-        next_page_token = response.get("nextPageToken")
+        next_page_token = None if reached_known_ids else response.get("nextPageToken")
+        if checkpoint_path:
+            write_json_atomic(checkpoint_path, {"playlist_id": playlist_id, "video_ids": video_ids,
+                                                 "next_page_token": next_page_token, "done": not next_page_token})
         if not next_page_token:
             break
 
-        time.sleep(1)  # Avoid hitting rate limits
-
     return video_ids
 
-def get_pewdiepie_all_video_details(video_ids: List) -> List[dict]:
+def _batch_checkpoint_path(checkpoint_dir: str, batch_ids: List[str]) -> str:
+    # The file name includes a hash of the ids, so a checkpoint is never reused for a different batch.
+    digest = hashlib.sha1(",".join(batch_ids).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(checkpoint_dir, f"videos_{digest}.json")
+
+def iter_video_items(video_ids: List[str], client_factory: Optional[Callable[[], Any]] = None, max_workers: int = 4,
+                     rate_limiter: Optional[TokenBucket] = None, checkpoint_dir: Optional[str] = None,
+                     client: Any = None) -> Iterator[List[Dict[str, Any]]]:
     """
-    I take all video ids as a list, then return a list of dictionaries with all videos' details in them.
-    In the final part where I run main, this list of discionaries is used to create a csv file.
+    Requests the details of all videos in batches of 50 ids (API limit) on a pool of max_workers threads.
+    Every thread gets its own client from client_factory, and all threads share one rate limiter.
+    Without client_factory, the threads share `client` if one is given (ex: a fake client), otherwise each builds a real one.
+    Yields the raw API items of each batch, in the same order as video_ids, so the caller can keep only what it needs.
+    With checkpoint_dir, each finished batch is saved to its own file, and batches already saved are not requested again,
+    so an interrupted crawl resumes where it stopped.
     """
-    videos_data = []
+    rate_limiter = rate_limiter or TokenBucket()
+    if client_factory is None:
+        client_factory = (lambda: client) if client is not None else build_youtube_client
+    batches = [video_ids[i:i + BATCH_SIZE] for i in range(0, len(video_ids), BATCH_SIZE)]
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    local = threading.local()
 
-    # I used ChatGPT for this loop.
-    for i in range(0, len(video_ids), 50):  # Process in batches of 50 (API limit)
-        request = youtube.videos().list(
+    def fetch_batch(batch_ids: List[str]) -> List[Dict[str, Any]]:
+        checkpoint_path = _batch_checkpoint_path(checkpoint_dir, batch_ids) if checkpoint_dir else None
+        if checkpoint_path:
+            saved = _read_json(checkpoint_path)
+            if saved is not None:
+                return saved
+        if not hasattr(local, "client"):
+            local.client = client_factory()
+        response = execute_with_backoff(lambda: local.client.videos().list(
             part="snippet,statistics,contentDetails,status",
-            id=",".join(video_ids[i:i+50])
-        )
-        response = request.execute()
+            id=",".join(batch_ids)
+        ), rate_limiter)
+        if checkpoint_path:
+            write_json_atomic(checkpoint_path, response["items"])
+        return response["items"]
 
-        # In the response of my request, I get all video details and append it to the list.
-        for item in response["items"]:
-            videos_data.append({
-                "video_id": item["id"],
-                "title": item["snippet"]["title"],
-                "published_at": item["snippet"]["publishedAt"],
-                "category_id": item["snippet"]["categoryId"],
-                "duration": item["contentDetails"]["duration"],
-                "views": item["statistics"].get("viewCount", 0),
-                "likes": item["statistics"].get("likeCount", 0),
-                "comments": item["statistics"].get("commentCount", 0)
-            })
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(fetch_batch, batches)
 
-        time.sleep(1)  # Avoid hitting rate limits
+def fetch_video_items(video_ids: List[str], client_factory: Optional[Callable[[], Any]] = None, max_workers: int = 4,
+                      rate_limiter: Optional[TokenBucket] = None, checkpoint_dir: Optional[str] = None,
+                      client: Any = None) -> List[List[Dict[str, Any]]]:
+    """The raw API items of every batch, see iter_video_items."""
+    return list(iter_video_items(video_ids, client_factory, max_workers, rate_limiter, checkpoint_dir, client))
 
-    return videos_data
+def _video_details(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Picks the columns I use from one video item of the API response."""
+    return {
+        "video_id": item["id"],
+        "title": item["snippet"]["title"],
+        "published_at": item["snippet"]["publishedAt"],
+        "category_id": item["snippet"]["categoryId"],
+        "duration": item["contentDetails"]["duration"],
+        "views": item["statistics"].get("viewCount", 0),
+        "likes": item["statistics"].get("likeCount", 0),
+        "comments": item["statistics"].get("commentCount", 0)
+    }
 
-if __name__ == "__main__":
+def get_pewdiepie_all_video_details(video_ids: List, client_factory: Optional[Callable[[], Any]] = None, max_workers: int = 4,
+                                    rate_limiter: Optional[TokenBucket] = None, checkpoint_dir: Optional[str] = None,
+                                    client: Any = None) -> List[dict]:
     """
-    I execute all the functions that I written to request all videos of PewDiePie,
-    with its categeories matched in a proper manner.
+    I take all video ids as a list, then return a list of dictionaries with all videos' details in them.
+    In the final part where I run main, this list of discionaries is used to create a csv file.
+    Batches are fetched concurrently and can be checkpointed, see fetch_video_items.
+    """
+    batches = fetch_video_items(video_ids, client_factory, max_workers, rate_limiter, checkpoint_dir, client)
+    # In the response of my requests, I get all video details and append it to the list.
+    return [_video_details(item) for items in batches for item in items]
+
+def fetch_video_records(video_ids: List[str], client_factory: Optional[Callable[[], Any]] = None, max_workers: int = 4,
+                        rate_limiter: Optional[TokenBucket] = None, checkpoint_dir: Optional[str] = None,
+                        client: Any = None) -> VideoRecordStore:
     """
-    channel_id = get_channel_id("PewDiePie")
-    uploads_playlist_id = get_pewdiepie_uploads_playlist(channel_id)
-    pewdiepie_video_ids = get_pewdiepie_all_video_ids(uploads_playlist_id)
-    pewdiepie_all_videos_details = get_pewdiepie_all_video_details(pewdiepie_video_ids)
-    df_all_videos_pewdiepie = pd.DataFrame(pewdiepie_all_videos_details)
+    Same crawl as get_pewdiepie_all_video_details, but every batch is appended straight into a VideoRecordStore
+    presized for all ids (typed columns, counters as numbers), so no per-video dicts of strings are kept.
+    """
+    store = VideoRecordStore(capacity=len(video_ids))
+    for items in iter_video_items(video_ids, client_factory, max_workers, rate_limiter, checkpoint_dir, client):
+        store.append_items(items)
+    return store
 
-    # Get the category mapping
-    category_mapping = get_video_categories()
+def videos_to_dataframe(video_details: List[dict], category_mapping: Dict[str, str]) -> pd.DataFrame:
+    """Creates the DataFrame that is saved as CSV from the list of video details, with category names matched to category ids."""
+    df = pd.DataFrame(video_details, columns=["video_id", "title", "published_at", "category_id", "duration", "views", "likes", "comments"])
     # Convert 'category_id' column to string (as API returns it as string)
-    df_all_videos_pewdiepie["category_id"] = df_all_videos_pewdiepie["category_id"].astype(str)
+    df["category_id"] = df["category_id"].astype(str)
     # Map category_id to category_name
-    df_all_videos_pewdiepie["category_name"] = df_all_videos_pewdiepie["category_id"].map(category_mapping)
-    print(df_all_videos_pewdiepie.head())
-    df_all_videos_pewdiepie.to_csv('pewdiepie_videos.csv', index=False, encoding="utf-8")
\ No newline at end of file
+    df["category_name"] = df["category_id"].map(category_mapping)
+    return df
+
+def merge_video_updates(existing: pd.DataFrame, updates: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merges freshly fetched videos into the stored ones by video_id.
+    Fetched rows replace the stored rows of the same video. Columns only the stored data has (ex: category_name_gpt)
+    are kept for videos that were fetched again, and are left empty for new videos.
+    The result is newest first, like the uploads playlist.
+    """
+    extra_columns = [column for column in existing.columns if column not in updates.columns]
+    updates = updates.merge(existing[["video_id"] + extra_columns], on="video_id", how="left")
+    unchanged = existing[~existing["video_id"].isin(updates["video_id"])]
+    merged = pd.concat([updates, unchanged], ignore_index=True)
+    # ISO 8601 timestamps in UTC sort correctly as strings.
+    merged = merged.sort_values("published_at", ascending=False, kind="stable", ignore_index=True)
+    return merged[list(existing.columns) + [column for column in updates.columns if column not in existing.columns]]
+
+def refresh_videos(existing: pd.DataFrame, playlist_id: str, recent_days: int = 30, client: Any = None,
+                   client_factory: Optional[Callable[[], Any]] = None, max_workers: int = 4,
+                   rate_limiter: Optional[TokenBucket] = None, checkpoint_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    Incremental version of the full crawl. Instead of every video in the channel, only these are requested:
+    - new videos: playlist paging stops once it reaches a video_id that is already stored
+    - stored videos published in the last recent_days days, because their views, likes and comments still change
+    The fetched videos are merged into existing by video_id (see merge_video_updates).
+    client and client_factory are used like in fetch_pewdiepie_videos.
+    """
+    rate_limiter = rate_limiter or TokenBucket()
+    new_ids = get_pewdiepie_all_video_ids(playlist_id, client=client, rate_limiter=rate_limiter, known_ids=set(existing["video_id"]))
+    published_at = pd.to_datetime(existing["published_at"], utc=True)
+    recent = existing.loc[published_at >= pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=recent_days), "video_id"]
+    # Keep the order and drop duplicates (a video can be both new and recent when the stored data is odd).
+    video_ids = list(dict.fromkeys(new_ids + list(recent)))
+
+    # Typed columns like the full crawl (see record_store.py), then the text columns of the stored CSV so the rows merge.
+    records = fetch_video_records(video_ids, client_factory, max_workers, rate_limiter, checkpoint_dir, client)
+    updates = records.to_dataframe(get_video_categories(client)).drop(columns="duration_seconds")
+    updates = updates.assign(published_at=updates["published_at"].dt.strftime(PUBLISHED_AT_FORMAT),
+                             category_id=updates["category_id"].astype(str), category_name=updates["category_name"].astype(object))
+    return merge_video_updates(existing, updates)
+
+def fetch_pewdiepie_videos(path: str = "pewdiepie_videos.csv", incremental: bool = False, recent_days: int = 30,
+                           store_path: Optional[str] = None, checkpoint_dir: str = "fetch_checkpoint", client: Any = None,
+                           client_factory: Optional[Callable[[], Any]] = None, rate_limiter: Optional[TokenBucket] = None) -> pd.DataFrame:
+    """
+    I execute all the functions that I written to request all videos of PewDiePie,
+    with its categeories matched in a proper manner, and save them to path.
+    With incremental, only new videos and videos from the last recent_days days are requested
+    and merged into the existing CSV. With store_path, the videos are also upserted into that SQLite store.
+    client, client_factory and rate_limiter are used for every request when given (see iter_video_items),
+    the real YouTube clients are only built when no client is given.
+    """
+    rate_limiter = rate_limiter or TokenBucket()
+    channel_id = get_channel_id("PewDiePie", client)
+    uploads_playlist_id = get_pewdiepie_uploads_playlist(channel_id, client)
+    # Finished pages and batches are saved in the checkpoint folder, so running this again after a failure resumes the crawl.
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    if incremental and os.path.exists(path):
+        existing_videos = pd.read_csv(path, encoding="utf-8", dtype={"video_id": str, "category_id": str})
+        df_all_videos_pewdiepie = refresh_videos(existing_videos, uploads_playlist_id, recent_days, client, client_factory,
+                                                 rate_limiter=rate_limiter, checkpoint_dir=checkpoint_dir)
+    else:
+        pewdiepie_video_ids = get_pewdiepie_all_video_ids(uploads_playlist_id, client, rate_limiter,
+                                                          checkpoint_path=os.path.join(checkpoint_dir, "video_ids.json"))
+        # Typed columns instead of a dict of strings per video, see record_store.py.
+        pewdiepie_video_records = fetch_video_records(pewdiepie_video_ids, client_factory, rate_limiter=rate_limiter,
+                                                      checkpoint_dir=checkpoint_dir, client=client)
+        # Get the category mapping
+        category_mapping = get_video_categories(client)
+        df_all_videos_pewdiepie = pewdiepie_video_records.to_dataframe(category_mapping).drop(columns="duration_seconds")
+    df_all_videos_pewdiepie.to_csv(path, index=False, encoding="utf-8", date_format=PUBLISHED_AT_FORMAT)
+    if store_path:
+        from video_store import VideoStore
+        with VideoStore(store_path) as store:
+            store.upsert(df_all_videos_pewdiepie, channel="PewDiePie")
+    # The crawl finished, so the next run starts from scratch.
+    shutil.rmtree(checkpoint_dir)
+    return df_all_videos_pewdiepie
+
+if __name__ == "__main__":
+    """
+    Fetches all PewDiePie videos into pewdiepie_videos.csv (see fetch_pewdiepie_videos, or python main.py fetch).
+    With --incremental, only new videos and videos from the last --recent-days days are requested
+    and merged into the existing CSV.
+    """
+    parser = argparse.ArgumentParser(description="Fetch all PewDiePie videos into pewdiepie_videos.csv.")
+    parser.add_argument("--incremental", action="store_true", help="only fetch new and recent videos and merge them into the existing CSV")
+    parser.add_argument("--recent-days", type=int, default=30, help="videos published in this many days are fetched again (default: 30)")
+    parser.add_argument("--store", default=None, help="also insert or update the videos in this SQLite store (see video_store.py)")
+    args = parser.parse_args()
+
+    print(fetch_pewdiepie_videos(incremental=args.incremental, recent_days=args.recent_days, store_path=args.store).head())
@@ -1,91 +1,285 @@
 import pandas as pd
-from typing import List, Dict, Any
-import matplotlib.pyplot as plt
-import seaborn as sns
+from typing import Dict, List, Optional, Sequence, Union
 import numpy as np
+from analysis_context import AnalysisContext, month_end
+from instrumentation import instrumented
+from sketches import KLLSketch
 
-def total_descriptive_analysis(dataframe: pd.DataFrame) -> None:
+METRICS = ("views", "likes", "comments")
+STATISTICS = ["count", "mean", "median", "mode", "min", "max", "range", "variance", "std", "q1", "q3", "iqr"]
+
+
+def _sorted_quantile(values: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
     """
-    This function first prints the overall measures of location and measures of spread for all videos.
-    Then it prints out measures of location and measures of spread for all categories.
+    Quantile of every group from values that are sorted inside each group.
+    Uses linear interpolation between the two closest values, like Series.quantile() does.
     """
-    df = dataframe.copy()
-    df['published_at'] = pd.to_datetime(df['published_at'])
+    position = (counts - 1) * q
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, counts - 1)
+    fraction = position - lower
+    low_values = values[starts + lower]
+    return low_values + (values[starts + upper] - low_values) * fraction
 
+def _sorted_mode(values: np.ndarray, codes: np.ndarray, n_groups: int) -> np.ndarray:
     """
-    I have taken all these calculation statements and methods from Week 9 exploratory analysis module.
-    Functions such as mean, median are self explanatory.
-    I used f string to round numbers with fractions.
-    """
-
-    mean_views_all = df['views'].mean() 
-    print(f"Mean views of all time: {mean_views_all:,.2f}")
-    median_view_all = df['views'].median()
-    print(f"Median views of all time: {median_view_all:,.2f}")
-    mode_view_all = df['views'].mode()[0]
-    print(f"Mode views of all time: {mode_view_all:,.2f}")
-    print(f"Range of views: {df['views'].max()-df['views'].min():,.2f}")
-    print(f"Variance of views: {df['views'].var():,.2f}")
-    print(f"Standard Deviation of views: {df['views'].std():,.2f}")
-    print(f"IQR of views: {df['views'].quantile(0.75)-df['views'].quantile(0.25):,.2f}")
-    print()
-
-    mean_likes_all = df['likes'].mean() 
-    print(f"Mean likes of all time: {mean_likes_all:,.2f}")
-    median_likes_all = df['likes'].median()
-    print(f"Median likes of all time: {median_likes_all:,.2f}")
-    mode_likes_all = df['likes'].mode()[0]
-    print(f"Mode likes of all time: {mode_likes_all:,.2f}")
-    print(f"Range of likes: {df['likes'].max()-df['likes'].min():,.2f}")
-    print(f"Variance of likes: {df['likes'].var():,.2f}")
-    print(f"Standard Deviation of likes: {df['likes'].std():,.2f}")
-    print(f"IQR of likes: {df['likes'].quantile(0.75)-df['likes'].quantile(0.25):,.2f}")
-    print()
-
-    mean_comments_all = df['comments'].mean()
-    print(f"Mean comments of all time: {mean_comments_all:,.2f}")
-    median_comments_all = df['comments'].median()
-    print(f"Median comments of all time: {median_comments_all:,.2f}")
-    mode_comments_all = df['comments'].mode()[0]
-    print(f"Mode comments of all time: {mode_comments_all:,.2f}")
-    print(f"Range of comments: {df['comments'].max()-df['comments'].min():,.2f}")
-    print(f"Variance of comments: {df['comments'].var():,.2f}")
-    print(f"Standard Deviation of comments: {df['comments'].std():,.2f}")
-    print(f"IQR of comments: {df['comments'].quantile(0.75)-df['comments'].quantile(0.25):,.2f}")
-    print()
-
-    for category, category_df in df.groupby("category_name_gpt"):
-        # groupby creates a dictionary key is where the column that dataframe is grouped and values which are grouped dataframes
-        # Measures of Location and Measures of Spread
+    Most frequent value of every group from values sorted by (group, value).
+    Ties go to the smallest value, the same value Series.mode()[0] gives. Groups without values get NaN.
+    """
+    mode = np.full(n_groups, np.nan)
+    if len(values) == 0:
+        return mode
+    run_starts = np.flatnonzero(np.r_[True, (values[1:] != values[:-1]) | (codes[1:] != codes[:-1])])
+    run_lengths = np.diff(np.r_[run_starts, len(values)])
+    run_codes = codes[run_starts]
+    # Order runs by group, then longest first, then smallest value first, and take the first run of each group.
+    order = np.lexsort((run_starts, -run_lengths, run_codes))
+    first_of_group = np.r_[True, run_codes[order][1:] != run_codes[order][:-1]]
+    mode[run_codes[order][first_of_group]] = values[run_starts[order][first_of_group]]
+    return mode
 
-        print(f"{category} category have {len(category_df)} number of videos in it after 2022.")
-        print(f"Mean views of {category} after 2022: {category_df['views'].mean():,.2f}")
-        print(f"Median views of {category} after 2022: {category_df['views'].median():,.2f}")
-        print(f"Mode views of {category} after 2022: {category_df['views'].mode()[0]:,.2f}")
-        print(f"Range of views of {category} after 2022: {category_df['views'].max()-category_df['views'].min():,.2f}")
-        print(f"Variance of views of {category} after 2022: {category_df['views'].var():,.2f}")
-        print(f"Standard Deviation of views of {category} after 2022: {category_df['views'].std():,.2f}")
-        print(f"IQR of views of {category} after 2022: {category_df['views'].quantile(0.75)-category_df['views'].quantile(0.25):,.2f}")
-        print()
+def _describe_values(values: np.ndarray, codes: np.ndarray, n_groups: int) -> pd.DataFrame:
+    """Computes every statistic in STATISTICS for one metric and all groups with a single sort."""
+    valid = ~np.isnan(values)
+    values, codes = values[valid], codes[valid]
+    order = np.lexsort((values, codes))  # One sort: by group, then by value inside the group
+    values, codes = values[order], codes[order]
 
-        print(f"Mean likes of {category} after 2022: {category_df['likes'].mean():,.2f}")
-        print(f"Median likes of {category} after 2022: {category_df['likes'].median():,.2f}")
-        print(f"Mode likes of {category} after 2022: {category_df['likes'].mode()[0]:,.2f}")
-        print(f"Range of likes of {category} after 2022: {category_df['likes'].max()-category_df['likes'].min():,.2f}")
-        print(f"Variance of likes of {category} after 2022: {category_df['likes'].var():,.2f}")
-        print(f"Standard Deviation of likes of {category} after 2022: {category_df['likes'].std():,.2f}")
-        print(f"IQR of likes of {category} after 2022: {category_df['likes'].quantile(0.75)-category_df['likes'].quantile(0.25):,.2f}")
-        print()
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    result = pd.DataFrame({"count": counts})
+    present = counts > 0
+    nonempty_starts, nonempty_counts = starts[present], counts[present]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(codes, weights=values, minlength=n_groups) / counts
+        # Two pass variance (sample variance, ddof=1) is more accurate than the sum of squares on large view counts.
+        variance = np.bincount(codes, weights=(values - mean[codes]) ** 2, minlength=n_groups) / (counts - 1)
+    result["mean"] = mean
+    for name, q in (("median", 0.5), ("q1", 0.25), ("q3", 0.75)):
+        result[name] = np.nan
+        result.loc[present, name] = _sorted_quantile(values, nonempty_starts, nonempty_counts, q)
+    result["mode"] = _sorted_mode(values, codes, n_groups)
+    result["min"] = np.nan
+    result.loc[present, "min"] = values[nonempty_starts]
+    result["max"] = np.nan
+    result.loc[present, "max"] = values[nonempty_starts + nonempty_counts - 1]
+    result["range"] = result["max"] - result["min"]
+    result["variance"] = np.where(counts > 1, variance, np.nan)
+    result["std"] = np.sqrt(result["variance"])
+    result["iqr"] = result["q3"] - result["q1"]
+    return result[STATISTICS]
+
+def _group_codes(dataframe: pd.DataFrame, by: Optional[str]) -> tuple:
+    """Integer group code of every row (-1 for a missing group), the groups in groupby() order and their number."""
+    if by is None:
+        return np.zeros(len(dataframe), dtype=np.int64), None, 1
+    codes, groups = pd.factorize(dataframe[by], sort=True)  # Same group order as groupby()
+    return codes, groups, len(groups)
+
+def _tidy_statistics(tables: List[pd.DataFrame], metrics: Sequence[str], by: Optional[str], groups, videos: np.ndarray) -> pd.DataFrame:
+    """Stacks the per metric tables into one row per (group, metric), group first, then metrics in the order they were asked for."""
+    for metric, table in zip(metrics, tables):
+        table.insert(0, "metric", metric)
+        table.insert(1, "videos", videos)
+        if groups is not None:
+            table.insert(0, by, np.asarray(groups))
+    result = pd.concat(tables, ignore_index=True)
+    if groups is not None:
+        n_groups = len(groups)
+        result = result.iloc[np.lexsort((np.repeat(np.arange(len(metrics)), n_groups), np.tile(np.arange(n_groups), len(metrics))))]
+    return result.reset_index(drop=True)
+
+@instrumented
+def describe_metrics(dataframe: pd.DataFrame, metrics: Sequence[str] = METRICS, by: Optional[str] = None) -> pd.DataFrame:
+    """
+    Measures of location and spread (mean, median, mode, range, variance, standard deviation, IQR, ...)
+    for every metric, for all videos or for every group of the `by` column.
+    Every metric is sorted once for all groups together, everything else is NumPy reductions over the sorted values.
+    Returns a tidy DataFrame: one row per (group, metric), one column per statistic,
+    plus 'videos' (number of rows in the group, missing values included).
+    """
+    codes, groups, n_groups = _group_codes(dataframe, by)
+    valid_group = codes >= 0
+    # Rows without a group (missing category) are left out like groupby() does.
+    codes = codes[valid_group]
+    videos = np.bincount(codes, minlength=n_groups)
+
+    tables = []
+    for metric in metrics:
+        values = dataframe[metric].to_numpy(dtype=np.float64, na_value=np.nan)[valid_group]
+        tables.append(_describe_values(values, codes, n_groups))
+    return _tidy_statistics(tables, metrics, by, groups, videos)
+
+def _group_keys(dataframe: pd.DataFrame, by: Union[None, str, Sequence[Union[str, pd.Series]]]) -> List[pd.Series]:
+    """Grouping columns as Series: column names are looked up, Series (ex: month_end(...)) are used as they are."""
+    if by is None:
+        return [pd.Series(0, index=dataframe.index, name=None)]
+    if isinstance(by, (str, pd.Series)):
+        by = [by]
+    return [dataframe[key] if isinstance(key, str) else key for key in by]
+
+@instrumented
+def quantile_sketches(dataframe: pd.DataFrame, metrics: Sequence[str] = METRICS, by=None, error: float = 0.01) -> Dict[tuple, KLLSketch]:
+    """
+    One KLL quantile sketch per group and metric, sized so quantiles are within `error` of the ranks (see sketches.py).
+    Keys are (group values..., metric). Sketches of separate data shards can be combined with merge_sketches.
+    """
+    keys = _group_keys(dataframe, by)
+    sketches = {}
+    for group, group_df in dataframe[list(metrics)].groupby(keys, observed=True, sort=True):
+        for metric in metrics:
+            sketches[group + (metric,)] = KLLSketch.from_error(error).update(group_df[metric].to_numpy(dtype=np.float64, na_value=np.nan))
+    return sketches
+
+@instrumented
+def merge_sketches(left: Dict[tuple, KLLSketch], right: Dict[tuple, KLLSketch]) -> Dict[tuple, KLLSketch]:
+    """Combines the sketches of two shards key by key (left is updated and returned)."""
+    for key, sketch in right.items():
+        if key in left:
+            left[key].merge(sketch)
+        else:
+            left[key] = sketch
+    return left
+
+@instrumented
+def sketch_quantiles(sketches: Dict[tuple, KLLSketch], names: Sequence[Optional[str]] = ()) -> pd.DataFrame:
+    """Median, quartiles and IQR of every sketch as a tidy DataFrame, one column per group name plus 'metric'."""
+    rows = []
+    for key, sketch in sketches.items():
+        q1, median, q3 = sketch.quantiles([0.25, 0.5, 0.75])
+        row = dict(zip(names, key[:-1]))
+        row.update({"metric": key[-1], "count": sketch.count, "median": median, "q1": q1, "q3": q3, "iqr": q3 - q1})
+        rows.append(row)
+    return pd.DataFrame(rows, columns=list(names) + ["metric", "count", "median", "q1", "q3", "iqr"])
 
-        print(f"Mean comments of {category} after 2022: {category_df['comments'].mean():,.2f}")
-        print(f"Median comments of {category} after 2022: {category_df['comments'].median():,.2f}")
-        print(f"Mode comments of {category} after 2022: {category_df['comments'].mode()[0]:,.2f}")
-        print(f"Range of comments of {category} after 2022: {category_df['comments'].max()-category_df['comments'].min():,.2f}")
-        print(f"Variance of comments of {category} after 2022: {category_df['comments'].var():,.2f}")
-        print(f"Standard Deviation of comments of {category} after 2022: {category_df['comments'].std():,.2f}")
-        print(f"IQR of comments of {category} after 2022: {category_df['comments'].quantile(0.75)-category_df['comments'].quantile(0.25):,.2f}")
+@instrumented
+def approximate_quantiles(dataframe: pd.DataFrame, metrics: Sequence[str] = METRICS, by=None, error: float = 0.01) -> pd.DataFrame:
+    """
+    Approximate medians and IQRs per group in bounded memory (a few hundred values per group and metric).
+    by can be None (all videos), a column name, or a list of column names and Series.
+    """
+    names = [key.name for key in _group_keys(dataframe, by)] if by is not None else []
+    return sketch_quantiles(quantile_sketches(dataframe, metrics, by, error), names)
+
+@instrumented
+def monthly_approximate_quantiles(dataframe: pd.DataFrame, metrics: Sequence[str] = METRICS, error: float = 0.01) -> pd.DataFrame:
+    """Approximate medians and IQRs per category and month (month end labels, like the time series plots)."""
+    return approximate_quantiles(dataframe, metrics, ["category_name_gpt", month_end(dataframe["published_at"])], error)
+
+@instrumented
+def describe_metrics_approximate(dataframe: pd.DataFrame, metrics: Sequence[str] = METRICS, by: Optional[str] = None,
+                                 error: float = 0.01) -> pd.DataFrame:
+    """
+    Same tidy result as describe_metrics without sorting any values: count, mean, variance, min and max are NumPy
+    reductions per group, median and IQR come from quantile sketches (within `error` of the ranks).
+    Mode needs every distinct value and is left out.
+    """
+    codes, groups, n_groups = _group_codes(dataframe, by)
+    valid_group = codes >= 0
+    codes = codes[valid_group]
+    videos = np.bincount(codes, minlength=n_groups)
+    # Row positions of every group (a stable sort of small integer codes, the values themselves are never sorted).
+    # With no groups at all (by a column of an empty selection), split would still give one empty piece.
+    group_rows = np.split(np.argsort(codes, kind="stable"), np.cumsum(videos)[:-1])[:n_groups]
+
+    tables = []
+    for metric in metrics:
+        values = dataframe[metric].to_numpy(dtype=np.float64, na_value=np.nan)[valid_group]
+        valid = ~np.isnan(values)
+        counts = np.bincount(codes[valid], minlength=n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.bincount(codes[valid], weights=values[valid], minlength=n_groups) / counts
+            variance = np.bincount(codes[valid], weights=(values[valid] - mean[codes[valid]]) ** 2, minlength=n_groups) / (counts - 1)
+        minimum, maximum = np.full(n_groups, np.inf), np.full(n_groups, -np.inf)
+        np.minimum.at(minimum, codes[valid], values[valid])
+        np.maximum.at(maximum, codes[valid], values[valid])
+        quartiles = np.array([KLLSketch.from_error(error).update(values[rows]).quantiles([0.25, 0.5, 0.75]) for rows in group_rows],
+                             dtype=np.float64).reshape(n_groups, 3)
+        table = pd.DataFrame({"count": counts, "mean": mean, "median": quartiles[:, 1],
+                              "min": np.where(counts > 0, minimum, np.nan), "max": np.where(counts > 0, maximum, np.nan)})
+        table["range"] = table["max"] - table["min"]
+        table["variance"] = np.where(counts > 1, variance, np.nan)
+        table["std"] = np.sqrt(table["variance"])
+        table["q1"], table["q3"] = quartiles[:, 0], quartiles[:, 2]
+        table["iqr"] = table["q3"] - table["q1"]
+        tables.append(table)
+    return _tidy_statistics(tables, metrics, by, groups, videos)
+
+@instrumented
+def compare_approximate_quantiles(dataframe: pd.DataFrame, metrics: Sequence[str] = METRICS, by: Optional[str] = "category_name_gpt",
+                                  error: float = 0.01) -> pd.DataFrame:
+    """
+    Accuracy check of the approximate mode against the exact one: exact and approximate median, Q1 and Q3 per group and metric,
+    with the rank error of every approximate value (fraction of the group between the approximate and the exact quantile).
+    """
+    exact = describe_metrics(dataframe, metrics, by)
+    approximate = approximate_quantiles(dataframe, metrics, by, error)
+    group_columns = [by] if by is not None else []
+    comparison = exact[group_columns + ["metric", "count", "median", "q1", "q3"]].merge(
+        approximate[group_columns + ["metric", "median", "q1", "q3"]], on=group_columns + ["metric"], suffixes=("", "_approx"))
+    keys = _group_keys(dataframe, by)
+    values_by_group = {(group if by is not None else 0, metric): np.sort(group_df[metric].dropna().to_numpy(dtype=np.float64))
+                       for group, group_df in dataframe.groupby(keys[0], observed=True) for metric in metrics}
+    for name, q in (("median", 0.5), ("q1", 0.25), ("q3", 0.75)):
+        ranks = [np.searchsorted(values_by_group[(row[by] if by is not None else 0, row["metric"])], row[f"{name}_approx"]) / row["count"]
+                 for _, row in comparison.iterrows()]
+        comparison[f"{name}_rank_error"] = np.abs(np.asarray(ranks) - q)
+    return comparison
+
+@instrumented
+def print_descriptive_report(overall: pd.DataFrame, per_category: pd.DataFrame, by: str = "category_name_gpt") -> None:
+    """
+    Prints the report of total_descriptive_analysis from the results of describe_metrics.
+    Mode lines are left out when the results have no 'mode' column (ex: the streaming report).
+    """
+    has_mode = "mode" in overall.columns
+    for row in overall.itertuples(index=False):
+        metric = row.metric
+        print(f"Mean {metric} of all time: {row.mean:,.2f}")
+        print(f"Median {metric} of all time: {row.median:,.2f}")
+        if has_mode:
+            print(f"Mode {metric} of all time: {row.mode:,.2f}")
+        print(f"Range of {metric}: {row.range:,.2f}")
+        print(f"Variance of {metric}: {row.variance:,.2f}")
+        print(f"Standard Deviation of {metric}: {row.std:,.2f}")
+        print(f"IQR of {metric}: {row.iqr:,.2f}")
         print()
 
+    for category, category_stats in per_category.groupby(by, sort=False, observed=True):
+        # Measures of Location and Measures of Spread
+        print(f"{category} category have {category_stats['videos'].iloc[0]} number of videos in it after 2022.")
+        for row in category_stats.itertuples(index=False):
+            metric = row.metric
+            print(f"Mean {metric} of {category} after 2022: {row.mean:,.2f}")
+            print(f"Median {metric} of {category} after 2022: {row.median:,.2f}")
+            if has_mode:
+                print(f"Mode {metric} of {category} after 2022: {row.mode:,.2f}")
+            print(f"Range of {metric} of {category} after 2022: {row.range:,.2f}")
+            print(f"Variance of {metric} of {category} after 2022: {row.variance:,.2f}")
+            print(f"Standard Deviation of {metric} of {category} after 2022: {row.std:,.2f}")
+            print(f"IQR of {metric} of {category} after 2022: {row.iqr:,.2f}")
+            print()
+
+@instrumented
+def total_descriptive_analysis(dataframe: Union[pd.DataFrame, AnalysisContext], approximate: bool = False, error: float = 0.01) -> pd.DataFrame:
+    """
+    This function first prints the overall measures of location and measures of spread for all videos.
+    Then it prints out measures of location and measures of spread for all categories.
+    I have taken all these calculation statements and methods from Week 9 exploratory analysis module.
+    The numbers come from describe_metrics, which is also returned: overall rows have no category (NaN),
+    the rest have one row per category and metric.
+    With approximate=True, medians and IQRs come from quantile sketches within `error` of the ranks
+    (describe_metrics_approximate), and mode is left out.
+    With an AnalysisContext, the statistics are cached like the other aggregates.
+    """
+    context = AnalysisContext.of(dataframe)
+    describe = describe_metrics if not approximate else lambda df, by=None: describe_metrics_approximate(df, by=by, error=error)
+    name = "descriptive" if not approximate else f"descriptive_approximate_{error}"
+    overall, per_category = context.cached(name, lambda: (describe(context.dataframe), describe(context.dataframe, by="category_name_gpt")))
+    print_descriptive_report(overall, per_category)
+    return pd.concat([overall, per_category], ignore_index=True)[per_category.columns]
+
 """
 1. **Measures of Location (Central Tendency)**
     - **Mean:** The average value, useful for understanding the general trend.
@@ -107,8 +301,10 @@ def total_descriptive_analysis(dataframe: pd.DataFrame) -> None:
 3. **Measures of Shape (Distribution)**
     - **Skewness:** Indicates if the data is skewed to the left or right.
     - **Kurtosis:** Measures the "tailedness" of the distribution, indicating outliers.
+    (distribution_analysis.py computes both per category and year, with log-scale histograms.)
       
 4. **Correlation (For Relationships Between Variables)**
     - **Correlation Coefficient:** Measures how two numerical variables relate to each other. For example, do more views generally mean more likes?
+    (distribution_analysis.py has Pearson and Spearman correlation matrices of views, likes, comments and duration.)
     Spread 5 different categories. Then compare their view/like scale to see what users engage with most when it comes to categories.
 """
\ No newline at end of file
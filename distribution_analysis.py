@@ -0,0 +1,370 @@
+import argparse
+from itertools import combinations
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+from analysis_context import AnalysisContext
+from instrumentation import instrumented
+
+METRICS = ("views", "likes", "comments", "duration_minutes")
+# Histogram bins are 1/BINS_PER_DECADE of a power of ten of (1 + value): 0, 1-1.15, ..., 1M-1.15M, ...
+BINS_PER_DECADE = 16
+# The joint (rank) histograms behind the mergeable Spearman use finer bins, only the occupied cells are kept.
+JOINT_BINS_PER_DECADE = 32
+# Internal key of "all categories" / "all periods". Results show it as an empty (None) category or period, like describe_metrics.
+ALL = "__all__"
+GROUP_NAMES = ["category", "period"]
+
+
+def _empty_index(names: List[str]) -> pd.MultiIndex:
+    return pd.MultiIndex.from_arrays([[]] * len(names), names=names)
+
+
+class _Level:
+    """Rows of one grouping level (ex: per category), the group number of each of them and the (category, period) key of every group."""
+    def __init__(self, rows: np.ndarray, codes: np.ndarray, groups: pd.MultiIndex):
+        self.rows = rows
+        self.codes = codes
+        self.groups = groups
+
+
+def _side(dataframe: pd.DataFrame, by: Optional[str], period: Optional[str]) -> Tuple[List[Tuple[np.ndarray, np.ndarray]], List[Tuple[np.ndarray, np.ndarray]]]:
+    """(codes, labels) of the category and period sides, the first of each being ALL. Missing categories get code -1."""
+    everything = (np.zeros(len(dataframe), dtype=np.int64), np.array([ALL], dtype=object))
+    categories, periods = [everything], [everything]
+    if by is not None:
+        codes, labels = pd.factorize(dataframe[by])
+        categories.append((codes, np.asarray(labels, dtype=object).astype(str)))
+    if period is not None:
+        published_at = AnalysisContext.of(dataframe).published_at()
+        if published_at.dt.tz is not None:
+            published_at = published_at.dt.tz_convert(None)
+        codes, labels = pd.factorize(published_at.dt.to_period(period))
+        periods.append((codes, np.asarray(labels.astype(str), dtype=object)))
+    return categories, periods
+
+def _group_levels(dataframe: pd.DataFrame, by: Optional[str], period: Optional[str]) -> List[_Level]:
+    """
+    Groups of every row at each level: all videos, per category, per period, per category and period.
+    Group keys are (category, period) where ALL stands for the whole data on that side.
+    Keys are combined as integers, the labels are only looked up for the groups that exist.
+    """
+    categories, periods = _side(dataframe, by, period)
+    levels = []
+    for category_codes, category_labels in categories:
+        for period_codes, period_labels in periods:
+            rows = np.flatnonzero((category_codes >= 0) & (period_codes >= 0))
+            keys = category_codes[rows] * len(period_labels) + period_codes[rows]
+            present = np.flatnonzero(np.bincount(keys, minlength=len(category_labels) * len(period_labels)))
+            lookup = np.full(len(category_labels) * len(period_labels), -1, dtype=np.int64)
+            lookup[present] = np.arange(len(present))
+            groups = pd.MultiIndex.from_arrays([category_labels[present // len(period_labels)], period_labels[present % len(period_labels)]],
+                                               names=GROUP_NAMES)
+            levels.append(_Level(rows, lookup[keys], groups))
+    return levels
+
+def _log_bins(values: np.ndarray, bins_per_decade: int) -> np.ndarray:
+    """Bin number of every value on the log10(1 + value) scale (negative values are put in bin 0)."""
+    return np.floor(np.log10(1 + np.maximum(values, 0)) * bins_per_decade).astype(np.int64)
+
+
+def _accumulate(values: np.ndarray, codes: np.ndarray, groups: int) -> dict:
+    """
+    Count, means, central moment sums (M2, M3, M4) and co-moments of every group in one vectorized pass:
+    group means first, then the power sums of the deviations with bincount.
+    Deviations are small compared to the raw values, so the sums stay accurate for counters in the billions.
+    """
+    count = np.bincount(codes, minlength=groups).astype(np.float64)
+    metrics = values.shape[1]
+    mean = np.empty((groups, metrics))
+    m = {power: np.empty((groups, metrics)) for power in (2, 3, 4)}
+    deviations = np.empty_like(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for j in range(metrics):
+            mean[:, j] = np.bincount(codes, values[:, j], minlength=groups) / count
+            deviations[:, j] = values[:, j] - mean[codes, j]
+            squares = deviations[:, j] * deviations[:, j]
+            m[2][:, j] = np.bincount(codes, squares, minlength=groups)
+            m[3][:, j] = np.bincount(codes, squares * deviations[:, j], minlength=groups)
+            m[4][:, j] = np.bincount(codes, squares * squares, minlength=groups)
+    comoment = np.zeros((groups, metrics, metrics))
+    for i in range(metrics):
+        comoment[:, i, i] = m[2][:, i]
+        for j in range(i + 1, metrics):
+            comoment[:, i, j] = comoment[:, j, i] = np.bincount(codes, deviations[:, i] * deviations[:, j], minlength=groups)
+    return {"count": count, "mean": mean, "m2": m[2], "m3": m[3], "m4": m[4], "comoment": comoment}
+
+
+def _cell_counts(level: _Level, metrics: List[str], bins: List[np.ndarray], names: List[str]) -> pd.Series:
+    """
+    Videos per (group, bin of each metric) cell, only the occupied cells. The cell of every video is packed in one int64
+    so the counting is a single value_counts, the index is then built from codes without looking at labels again.
+    """
+    widths = [int(column.max()) + 1 for column in bins]
+    keys = level.codes.astype(np.int64)
+    for column, width in zip(bins, widths):
+        keys = keys * width + column
+    counts = pd.Series(keys).value_counts(sort=False)
+    keys = counts.index.to_numpy()
+    bin_codes = []
+    for width in reversed(widths):
+        keys, column = np.divmod(keys, width)
+        bin_codes.insert(0, column)
+    index = pd.MultiIndex(levels=[level.groups.levels[0], level.groups.levels[1]] + [[metric] for metric in metrics] + [np.arange(width) for width in widths],
+                          codes=[level.groups.codes[0][keys], level.groups.codes[1][keys]] + [np.zeros(len(keys), dtype=np.int64)] * len(metrics) + bin_codes,
+                          names=GROUP_NAMES + names, verify_integrity=False)
+    return pd.Series(counts.to_numpy(), index=index)
+
+
+class DistributionSummary:
+    """
+    Mergeable distribution shape and correlation state of views, likes, comments and duration,
+    for all videos, per category, per period (year by default) and per category and period:
+    - count, mean and central moment sums M2, M3, M4 per metric (variance, skewness, kurtosis)
+    - co-moments of every pair of metrics (Pearson correlation)
+    - log-scale histograms per metric, and sparse joint log-scale histograms of every pair (approximate Spearman correlation)
+    Summaries of separate chunks, files or shards are combined with merge() (Chan/Pebay pairwise formulas for the moments,
+    sums for the histograms), with the same moments and correlations as computing them on all rows at once.
+    Rows with a missing metric are left out, so every statistic of a group is over the same videos.
+    """
+    def __init__(self, by: Optional[str] = "category_name_gpt", period: Optional[str] = "Y", metrics: Sequence[str] = METRICS):
+        self.by = by
+        self.period = period
+        self.metrics = list(metrics)
+        # No groups until videos are added, the results of an empty summary are empty tables with the same columns.
+        self.index = _empty_index(GROUP_NAMES)
+        self.count = np.empty(0)
+        self.mean = self.m2 = self.m3 = self.m4 = np.empty((0, len(self.metrics)))
+        self.comoment = np.empty((0, len(self.metrics), len(self.metrics)))
+        self.histograms = pd.Series(index=_empty_index(GROUP_NAMES + ["metric", "bin"]), dtype=np.int64)
+        self.joint_histograms = pd.Series(index=_empty_index(GROUP_NAMES + ["metric_a", "metric_b", "bin_a", "bin_b"]), dtype=np.int64)
+
+    def _values(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        columns = {}
+        for metric in self.metrics:
+            if metric == "duration_minutes" and metric not in dataframe.columns:
+                columns[metric] = AnalysisContext.of(dataframe).duration_minutes()
+            else:
+                columns[metric] = dataframe[metric]
+        return pd.DataFrame(columns).astype(np.float64)
+
+    @instrumented
+    def update(self, dataframe: pd.DataFrame) -> "DistributionSummary":
+        """Adds the videos of one DataFrame (a whole table or one chunk) and returns the summary."""
+        values = self._values(dataframe)
+        complete = values.notna().all(axis=1).to_numpy()
+        dataframe, values = dataframe[complete], values.to_numpy()[complete]
+        if len(values) == 0:
+            return self
+        other = DistributionSummary(self.by, self.period, self.metrics)
+        bins = _log_bins(values, BINS_PER_DECADE)
+        joint_bins = _log_bins(values, JOINT_BINS_PER_DECADE)
+        moments, histograms, joint_histograms = [], [], []
+        for level in _group_levels(dataframe, self.by, self.period):
+            level_values = values[level.rows]
+            moments.append((level.groups, _accumulate(level_values, level.codes, len(level.groups))))
+            for j, metric in enumerate(self.metrics):
+                histograms.append(_cell_counts(level, [metric], [bins[level.rows, j]], ["metric", "bin"]))
+            for a, b in combinations(range(len(self.metrics)), 2):
+                joint_histograms.append(_cell_counts(level, [self.metrics[a], self.metrics[b]], [joint_bins[level.rows, a], joint_bins[level.rows, b]],
+                                                     ["metric_a", "metric_b", "bin_a", "bin_b"]))
+        other.index = pd.MultiIndex.from_tuples([key for groups, _ in moments for key in groups], names=GROUP_NAMES)
+        for name in ("count", "mean", "m2", "m3", "m4", "comoment"):
+            setattr(other, name, np.concatenate([state[name] for _, state in moments]))
+        other.histograms = pd.concat(histograms)
+        other.joint_histograms = pd.concat(joint_histograms)
+        return self.merge(other)
+
+    def merge(self, other: "DistributionSummary") -> "DistributionSummary":
+        """Combines another summary (ex: another chunk, file or worker) into this one and returns this summary."""
+        if len(other.index) == 0:
+            return self
+        if len(self.index) == 0:
+            for name in ("index", "count", "mean", "m2", "m3", "m4", "comoment", "histograms", "joint_histograms"):
+                setattr(self, name, getattr(other, name))
+            return self
+        index = self.index.union(other.index)
+        left, right = self._aligned(index), other._aligned(index)
+        na, nb = left["count"][:, None], right["count"][:, None]
+        n = na + nb
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = np.where(nb > 0, right["mean"] - left["mean"], 0)
+            weight = np.where(n > 0, nb / n, 0)
+            self.mean = left["mean"] + delta * weight
+            ratio = np.where(n > 0, na * nb / n, 0)
+            self.m2 = left["m2"] + right["m2"] + delta ** 2 * ratio
+            self.m3 = (left["m3"] + right["m3"] + delta ** 3 * ratio * np.where(n > 0, (na - nb) / n, 0)
+                       + 3 * delta * np.where(n > 0, (na * right["m2"] - nb * left["m2"]) / n, 0))
+            self.m4 = (left["m4"] + right["m4"] + delta ** 4 * ratio * np.where(n > 0, (na ** 2 - na * nb + nb ** 2) / n ** 2, 0)
+                       + 6 * delta ** 2 * np.where(n > 0, (na ** 2 * right["m2"] + nb ** 2 * left["m2"]) / n ** 2, 0)
+                       + 4 * delta * np.where(n > 0, (na * right["m3"] - nb * left["m3"]) / n, 0))
+            self.comoment = left["comoment"] + right["comoment"] + delta[:, :, None] * delta[:, None, :] * ratio[:, :, None]
+        self.count = left["count"] + right["count"]
+        self.index = index
+        self.histograms = self.histograms.add(other.histograms, fill_value=0).astype(np.int64)
+        self.joint_histograms = self.joint_histograms.add(other.joint_histograms, fill_value=0).astype(np.int64)
+        return self
+
+    def _aligned(self, index: pd.MultiIndex) -> dict:
+        """State arrays reindexed to `index`, groups this summary does not have are empty (count 0)."""
+        positions = self.index.get_indexer(index)
+        found = positions >= 0
+        aligned = {}
+        for name in ("count", "mean", "m2", "m3", "m4", "comoment"):
+            array = getattr(self, name)
+            result = np.zeros((len(index),) + array.shape[1:])
+            result[found] = array[positions[found]]
+            aligned[name] = result
+        return aligned
+
+    def _output_index(self, index: pd.MultiIndex) -> pd.MultiIndex:
+        """ALL shown as None, like the overall rows of describe_metrics."""
+        return pd.MultiIndex.from_arrays([index.get_level_values(name).astype(object).where(index.get_level_values(name) != ALL, None)
+                                          for name in index.names], names=index.names)
+
+    def shape(self) -> pd.DataFrame:
+        """
+        One row per group and metric: videos, mean, variance, std, skewness and excess kurtosis
+        (sample adjusted like Series.skew() and Series.kurt(), NaN when there are too few videos).
+        """
+        n = self.count[:, None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            variance = np.where(n > 1, self.m2 / (n - 1), np.nan)
+            g1 = np.sqrt(n) * self.m3 / self.m2 ** 1.5
+            g2 = n * self.m4 / self.m2 ** 2 - 3
+            skewness = np.where(n > 2, g1 * np.sqrt(n * (n - 1)) / (n - 2), np.nan)
+            kurtosis = np.where(n > 3, ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3)), np.nan)
+            # A constant metric has no shape.
+            skewness = np.where(self.m2 > 0, skewness, np.nan)
+            kurtosis = np.where(self.m2 > 0, kurtosis, np.nan)
+        groups, metrics = len(self.index), len(self.metrics)
+        output = self._output_index(self.index)
+        return pd.DataFrame({
+            "category": np.repeat(output.get_level_values("category"), metrics),
+            "period": np.repeat(output.get_level_values("period"), metrics),
+            "metric": np.tile(self.metrics, groups),
+            "videos": np.repeat(self.count, metrics).astype(np.int64),
+            "mean": self.mean.ravel(),
+            "variance": variance.ravel(),
+            "std": np.sqrt(variance).ravel(),
+            "skewness": skewness.ravel(),
+            "kurtosis": kurtosis.ravel(),
+        })
+
+    def pearson(self) -> pd.DataFrame:
+        """Pearson correlation matrix of the metrics for every group, indexed by (category, period, metric)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scale = np.sqrt(np.einsum("gii->gi", self.comoment))
+            correlation = self.comoment / (scale[:, :, None] * scale[:, None, :])
+        return self._matrix_frame(correlation)
+
+    def spearman(self) -> pd.DataFrame:
+        """
+        Approximate Spearman correlation matrix for every group, from the joint log-scale histograms:
+        videos in the same cell share the average rank of the cell (1/32 of a decade), which slightly lowers
+        the correlation compared to exact ranks (by about 0.001 over all videos, more in groups of a few videos where ties are common).
+        Use spearman_exact() when the data fits in memory.
+        """
+        correlation = np.repeat(np.eye(len(self.metrics))[None], len(self.index), axis=0)
+        cells = self.joint_histograms
+        if len(cells):
+            # Every (group, pair of metrics) is one weighted Pearson correlation of midranks, all computed at once with bincount.
+            pair_codes, pairs = cells.index.droplevel(["bin_a", "bin_b"]).factorize()
+            counts = cells.to_numpy().astype(np.float64)
+            rank_a = _midranks(pair_codes, cells.index.get_level_values("bin_a").to_numpy(), counts, len(pairs))
+            rank_b = _midranks(pair_codes, cells.index.get_level_values("bin_b").to_numpy(), counts, len(pairs))
+            total = np.bincount(pair_codes, counts, minlength=len(pairs))
+            deviation_a = rank_a - (np.bincount(pair_codes, counts * rank_a, minlength=len(pairs)) / total)[pair_codes]
+            deviation_b = rank_b - (np.bincount(pair_codes, counts * rank_b, minlength=len(pairs)) / total)[pair_codes]
+            covariance = np.bincount(pair_codes, counts * deviation_a * deviation_b, minlength=len(pairs))
+            variance_a = np.bincount(pair_codes, counts * deviation_a ** 2, minlength=len(pairs))
+            variance_b = np.bincount(pair_codes, counts * deviation_b ** 2, minlength=len(pairs))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                rho = np.where((variance_a > 0) & (variance_b > 0), covariance / np.sqrt(variance_a * variance_b), np.nan)
+            groups = self.index.get_indexer(pairs.droplevel([2, 3]).set_names(GROUP_NAMES))
+            i = np.array([self.metrics.index(metric) for metric in pairs.get_level_values(2)], dtype=np.int64)
+            j = np.array([self.metrics.index(metric) for metric in pairs.get_level_values(3)], dtype=np.int64)
+            correlation[groups, i, j] = correlation[groups, j, i] = rho
+        return self._matrix_frame(correlation)
+
+    def _matrix_frame(self, matrices: np.ndarray) -> pd.DataFrame:
+        groups, metrics = len(self.index), len(self.metrics)
+        output = self._output_index(self.index)
+        index = pd.MultiIndex.from_arrays([np.repeat(output.get_level_values(name), metrics) for name in GROUP_NAMES]
+                                          + [np.tile(self.metrics, groups)], names=GROUP_NAMES + ["metric"])
+        return pd.DataFrame(matrices.reshape(groups * metrics, metrics), index=index, columns=self.metrics)
+
+    def histogram_table(self) -> pd.DataFrame:
+        """Log-scale histograms: one row per group, metric and occupied bin, with the bin's value range [low, high)."""
+        table = self.histograms.rename("videos").reset_index()
+        table["low"] = 10 ** (table["bin"] / BINS_PER_DECADE) - 1
+        table["high"] = 10 ** ((table["bin"] + 1) / BINS_PER_DECADE) - 1
+        table[GROUP_NAMES] = table[GROUP_NAMES].astype(object).where(table[GROUP_NAMES] != ALL, None)
+        return table[GROUP_NAMES + ["metric", "bin", "low", "high", "videos"]]
+
+
+def _midranks(pair_codes: np.ndarray, bins: np.ndarray, counts: np.ndarray, pairs: int) -> np.ndarray:
+    """Rank of the videos of every cell along one metric: the middle of its bin's place among the videos of the same group."""
+    width = int(bins.max()) + 1
+    totals = np.bincount(pair_codes * width + bins, counts, minlength=pairs * width).reshape(pairs, width)
+    midranks = np.cumsum(totals, axis=1) - totals / 2 + 0.5
+    return midranks.ravel()[pair_codes * width + bins]
+
+
+@instrumented
+def distribution_analysis(dataframe: Union[pd.DataFrame, AnalysisContext], by: Optional[str] = "category_name_gpt", period: Optional[str] = "Y",
+                          metrics: Sequence[str] = METRICS) -> DistributionSummary:
+    """
+    Skewness, kurtosis, correlations and log-scale histograms of views, likes, comments and duration,
+    for all videos, per category and per period (year by default), in one pass. Cached with the other aggregates of a context.
+    """
+    context = AnalysisContext.of(dataframe)
+    return context.cached(f"distribution_{by}_{period}_{'_'.join(metrics)}",
+                          lambda: DistributionSummary(by, period, metrics).update(context.dataframe))
+
+@instrumented
+def spearman_exact(dataframe: pd.DataFrame, by: Optional[str] = "category_name_gpt", period: Optional[str] = "Y",
+                   metrics: Sequence[str] = METRICS) -> pd.DataFrame:
+    """
+    Exact Spearman correlation matrices (Pearson correlation of the average ranks within each group), same layout as
+    DistributionSummary.pearson(). Needs all rows in memory, use DistributionSummary.spearman() for chunked data.
+    """
+    values = DistributionSummary(by, period, metrics)._values(dataframe)
+    complete = values.notna().all(axis=1).to_numpy()
+    dataframe, values = dataframe[complete], values[complete].reset_index(drop=True)
+    frames = []
+    for level in _group_levels(dataframe, by, period):
+        ranks = values.iloc[level.rows].groupby(level.codes).rank(method="average").to_numpy()
+        summary = DistributionSummary(by, period, metrics)
+        summary.index, summary.comoment = level.groups, _accumulate(ranks, level.codes, len(level.groups))["comoment"]
+        frames.append(summary.pearson())
+    return pd.concat(frames)
+
+def distribution_from_chunks(chunks: Iterable[pd.DataFrame], by: Optional[str] = "category_name_gpt", period: Optional[str] = "Y",
+                             metrics: Sequence[str] = METRICS) -> DistributionSummary:
+    """Builds the summary chunk by chunk (ex: streaming.read_video_chunks), for tables that do not fit in memory."""
+    summary = DistributionSummary(by, period, metrics)
+    for chunk in chunks:
+        summary.update(chunk)
+    return summary
+
+
+if __name__ == "__main__":
+    """
+    Measures of shape and correlation planned at the end of descriptive_analysis.py, over a CSV of any size:
+    python distribution_analysis.py pewdiepie_videos_gpt.csv --period Y
+    """
+    from streaming import read_video_chunks
+
+    parser = argparse.ArgumentParser(description="Skewness, kurtosis and correlations of the video metrics.")
+    parser.add_argument("path", nargs="?", default="pewdiepie_videos_gpt.csv")
+    parser.add_argument("--period", default="Y", help="pandas period of the per period statistics (Y, Q, M)")
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    args = parser.parse_args()
+
+    summary = distribution_from_chunks(read_video_chunks(args.path, args.chunksize), period=args.period)
+    overall = summary.shape()
+    print(overall[overall["period"].isna()].to_string(index=False))
+    for correlation in (summary.pearson(), summary.spearman()):
+        everything = correlation.index.get_level_values("category").isna() & correlation.index.get_level_values("period").isna()
+        print(correlation[everything].droplevel(GROUP_NAMES).round(3).to_string())
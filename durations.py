@@ -0,0 +1,138 @@
+import re
+from typing import Dict, Iterable, Tuple
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+# Same pattern isodate uses for ISO 8601 durations (ex: PT29M9S, PT1H2M, P1DT3H, P2W, -PT5M).
+# Fractions may use '.' or ',' like in the standard.
+ISO8601_DURATION_REGEX = re.compile(
+    r"^(?P<sign>[+-])?P(?!\b)"
+    r"(?P<years>[0-9]+(?:[,.][0-9]+)?Y)?"
+    r"(?P<months>[0-9]+(?:[,.][0-9]+)?M)?"
+    r"(?P<weeks>[0-9]+(?:[,.][0-9]+)?W)?"
+    r"(?P<days>[0-9]+(?:[,.][0-9]+)?D)?"
+    r"(?:T(?P<hours>[0-9]+(?:[,.][0-9]+)?H)?"
+    r"(?P<minutes>[0-9]+(?:[,.][0-9]+)?M)?"
+    r"(?P<seconds>[0-9]+(?:[,.][0-9]+)?S)?)?$"
+)
+
+# Seconds in one unit of each part that has a fixed length.
+# Years and months have no fixed length, isodate leaves them out of total_seconds(), so they count as 0 here too.
+UNIT_SECONDS = {"weeks": 604800, "days": 86400, "hours": 3600, "minutes": 60, "seconds": 1}
+
+# Distinct duration strings already parsed, shared between calls. A channel only has a few thousand distinct lengths.
+_DURATION_SECONDS_CACHE: Dict[str, float] = {}
+MAX_CACHE_SIZE = 1_000_000
+
+
+def _parse_alternative_durations(durations: pd.Series) -> np.ndarray:
+    """
+    Durations the regex does not cover, like ISO 8601's alternative format (P0003-06-04T12:30:05), parsed one by one with isodate.
+    Raises ValueError for anything that is not an ISO 8601 duration, like isodate does.
+    """
+    try:
+        import isodate
+    except ImportError:
+        raise ValueError(f"Unable to parse ISO 8601 duration(s): {list(durations.head(5))}") from None
+    total_seconds = []
+    for duration in durations:
+        try:
+            total_seconds.append(isodate.parse_duration(duration).total_seconds())
+        except (isodate.ISO8601Error, ValueError) as error:
+            raise ValueError(f"Unable to parse ISO 8601 duration: {duration!r}") from error
+    return np.asarray(total_seconds, dtype=np.float64)
+
+def _parse_unique_durations(durations: pd.Series) -> np.ndarray:
+    """
+    Parses a Series of distinct duration strings into total seconds (float) with one regex pass.
+    The few strings in another ISO 8601 format fall back to isodate (see _parse_alternative_durations).
+    """
+    invalid = ~durations.str.match(ISO8601_DURATION_REGEX).fillna(False).astype(bool)
+    if invalid.any():
+        total_seconds = np.empty(len(durations), dtype=np.float64)
+        total_seconds[invalid.to_numpy()] = _parse_alternative_durations(durations[invalid])
+        if (~invalid).any():
+            total_seconds[~invalid.to_numpy()] = _parse_unique_durations(durations[~invalid])
+        return total_seconds
+    parts = durations.str.extract(ISO8601_DURATION_REGEX)
+
+    total_seconds = np.zeros(len(durations), dtype=np.float64)
+    for unit, unit_seconds in UNIT_SECONDS.items():
+        # Drop the unit letter and accept ',' as decimal separator, missing parts are 0.
+        values = parts[unit].str[:-1].str.replace(',', '.', regex=False)
+        total_seconds += pd.to_numeric(values).fillna(0).to_numpy(dtype=np.float64) * unit_seconds
+    total_seconds[(parts['sign'] == '-').to_numpy()] *= -1
+    return total_seconds
+
+def _cache_durations(parsed: Iterable[Tuple[str, float]], count: int) -> None:
+    """Adds parsed durations to the cache, emptied first when it would grow past MAX_CACHE_SIZE."""
+    if len(_DURATION_SECONDS_CACHE) + count > MAX_CACHE_SIZE:
+        _DURATION_SECONDS_CACHE.clear()
+    _DURATION_SECONDS_CACHE.update(parsed)
+
+@instrumented
+def duration_seconds(durations: pd.Series) -> np.ndarray:
+    """
+    Converts a whole column of ISO 8601 durations into total seconds (float) at once.
+    Every distinct string is parsed only once: the column is factorized and only strings missing from the cache are parsed.
+    """
+    codes, uniques = pd.factorize(durations, use_na_sentinel=True)
+    if (codes == -1).any():
+        raise ValueError("Duration column contains missing values.")
+    uniques = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+
+    cached = uniques.map(_DURATION_SECONDS_CACHE)
+    missing = cached.isna()
+    if missing.any():
+        parsed = _parse_unique_durations(uniques[missing].astype(str))
+        _cache_durations(zip(uniques[missing], parsed), len(parsed))
+        cached[missing] = parsed
+    return cached.to_numpy(dtype=np.float64)[codes]
+
+@instrumented
+def parse_durations(durations: pd.Series) -> pd.DataFrame:
+    """
+    Batch version of parse_duration_to_minutes.
+    Returns a DataFrame (same index as the input) with integer 'duration_seconds' and 'duration_minutes' columns.
+    Minutes are floored the same way int(total_seconds() // 60) does.
+    """
+    total_seconds = duration_seconds(durations)
+    return pd.DataFrame({
+        'duration_seconds': np.floor(total_seconds).astype(np.int64),
+        'duration_minutes': np.floor_divide(total_seconds, 60).astype(np.int64),
+    }, index=durations.index)
+
+def format_durations(seconds: np.ndarray) -> np.ndarray:
+    """
+    Whole seconds back to ISO 8601 durations like the API writes them (PT29M9S, PT1H2M, PT35M, P0D for zero).
+    Longer than a day stays in hours (PT26H), which parses to the same seconds.
+    """
+    seconds = np.asarray(seconds, dtype=np.int64)
+    hours, rest = np.divmod(seconds, 3600)
+    minutes, secs = np.divmod(rest, 60)
+    def part(values: np.ndarray, unit: str) -> np.ndarray:
+        return np.where(values > 0, np.char.add(values.astype(str), unit), "")
+    durations = np.char.add(np.char.add(np.char.add("PT", part(hours, "H")), part(minutes, "M")), part(secs, "S"))
+    return np.where(seconds > 0, durations, "P0D")
+
+def _parse_duration(duration: str) -> float:
+    """One duration string into total seconds, in plain Python (a pandas Series per string costs milliseconds)."""
+    match = ISO8601_DURATION_REGEX.match(duration)
+    if match is None:
+        return float(_parse_alternative_durations(pd.Series([duration], dtype=object))[0])
+    parts = match.groupdict()
+    total_seconds = sum(float(parts[unit][:-1].replace(',', '.')) * unit_seconds
+                        for unit, unit_seconds in UNIT_SECONDS.items() if parts[unit])
+    return -total_seconds if parts['sign'] == '-' else total_seconds
+
+def parse_duration_to_minutes(duration: str) -> int:
+    """
+    Function to parse and convert duration to minutes.
+    Takes isodate duration format (ex: PT29M9S) and turns it into mathmetical number.
+    """
+    total_seconds = _DURATION_SECONDS_CACHE.get(duration)
+    if total_seconds is None:
+        total_seconds = _parse_duration(duration)
+        _cache_durations([(duration, total_seconds)], 1)
+    return int(total_seconds // 60)  # Convert seconds to minutes
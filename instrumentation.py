@@ -0,0 +1,203 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+# Turned on with PEWDIEPIE_INSTRUMENT=1 (or enable()). cProfile and tracemalloc captures are opt-in on top of it,
+# they slow the stages down: PEWDIEPIE_PROFILE=1 and PEWDIEPIE_TRACEMALLOC=1.
+_ENABLED = os.environ.get("PEWDIEPIE_INSTRUMENT", "") not in ("", "0")
+_PROFILE = os.environ.get("PEWDIEPIE_PROFILE", "") not in ("", "0")
+_TRACE_MEMORY = os.environ.get("PEWDIEPIE_TRACEMALLOC", "") not in ("", "0")
+PROFILE_LINES = 15  # Functions kept from each stage's profile, by cumulative time
+
+# Finished stages of this run, in the order they finished, and the stages currently running (innermost last).
+_RECORDS: List[Dict[str, Any]] = []
+_RUNNING: List["Stage"] = []
+
+
+def enable(profile: bool = False, trace_memory: bool = False) -> None:
+    global _ENABLED, _PROFILE, _TRACE_MEMORY
+    _ENABLED, _PROFILE, _TRACE_MEMORY = True, profile, trace_memory
+
+def disable() -> None:
+    global _ENABLED
+    _ENABLED = False
+
+def is_enabled() -> bool:
+    return _ENABLED
+
+def reset() -> None:
+    _RECORDS.clear()
+
+def records() -> List[Dict[str, Any]]:
+    return list(_RECORDS)
+
+def _rss_bytes() -> Optional[int]:
+    """Current resident memory of the process (Linux), None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def row_count(value: Any) -> Optional[int]:
+    """Rows of a DataFrame, Series, array or AnalysisContext, None for anything else."""
+    if hasattr(value, "dataframe"):
+        value = value.dataframe
+    if hasattr(value, "shape") and len(getattr(value, "shape")) > 0:
+        return int(value.shape[0])
+    return None
+
+
+class Stage:
+    """
+    One timed stage: wall time, CPU time, rows in and out, and memory delta (resident memory, or traced Python
+    allocations with peak when tracemalloc is on). Use it through stage() or @instrumented, not directly.
+    Rows out can be set inside the block: `with stage("load") as s: ...; s.rows_out = len(df)`.
+    """
+    def __init__(self, name: str, rows_in: Optional[int] = None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out: Optional[int] = None
+        self._peak = 0
+        self._profiler: Optional[cProfile.Profile] = None
+
+    def __enter__(self) -> "Stage":
+        self.parent = _RUNNING[-1].name if _RUNNING else None
+        self.depth = len(_RUNNING)
+        if _TRACE_MEMORY:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if _RUNNING:
+                # The peak counter is shared, keep the parent's peak so far before restarting it for this stage.
+                _RUNNING[-1]._peak = max(_RUNNING[-1]._peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._memory = tracemalloc.get_traced_memory()[0]
+        else:
+            self._memory = _rss_bytes()
+        # Only one profiler can run at a time, so nested stages are part of the outer stage's profile.
+        if _PROFILE and not any(running._profiler for running in _RUNNING):
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        _RUNNING.append(self)
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, error, traceback) -> None:
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        _RUNNING.pop()
+        record = {"name": self.name, "parent": self.parent, "depth": self.depth, "wall_seconds": wall, "cpu_seconds": cpu,
+                  "rows_in": self.rows_in, "rows_out": self.rows_out, "memory_delta_bytes": None, "memory_peak_bytes": None,
+                  "error": None if error_type is None else error_type.__name__}
+        if _TRACE_MEMORY and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            record["memory_delta_bytes"] = current - self._memory
+            record["memory_peak_bytes"] = max(self._peak, peak) - self._memory
+        elif self._memory is not None:
+            rss = _rss_bytes()
+            record["memory_delta_bytes"] = None if rss is None else rss - self._memory
+        if self._profiler is not None:
+            self._profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(self._profiler, stream=output).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            record["profile"] = output.getvalue()
+        _RECORDS.append(record)
+
+
+class _NoStage:
+    """What stage() returns when instrumentation is off: does nothing, so the stages cost one function call."""
+    rows_in = rows_out = None
+
+    def __enter__(self) -> "_NoStage":
+        return self
+
+    def __exit__(self, error_type, error, traceback) -> None:
+        pass
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        pass
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str, rows_in: Optional[int] = None):
+    """Context manager timing a block of code as one stage of the run (nothing is recorded when instrumentation is off)."""
+    return Stage(name, rows_in) if _ENABLED else _NO_STAGE
+
+def instrumented(function: Callable) -> Callable:
+    """
+    Records every call of the function as a stage named module.function (module.Class.method for methods),
+    with the rows of its first argument (a DataFrame or AnalysisContext) as rows in and the rows of what it returns as rows out.
+    When instrumentation is off the call goes straight to the function.
+    """
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _ENABLED:
+            return function(*args, **kwargs)
+        with Stage(name, row_count(args[0]) if args else None) as current:
+            result = function(*args, **kwargs)
+            current.rows_out = row_count(result)
+        return result
+    return wrapper
+
+def summary_table(stage_records: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Text table of the stages of the run, in the order they started, nested stages indented under their parent."""
+    # Records are added when a stage finishes, so a parent comes after its children.
+    ordered = _start_order(_RECORDS if stage_records is None else stage_records)
+
+    def number(value: Optional[float], scale: float = 1, fmt: str = "{:,.0f}") -> str:
+        return "" if value is None else fmt.format(value / scale)
+
+    header = f"{'stage':<72} {'wall s':>9} {'cpu s':>9} {'rows in':>11} {'rows out':>11} {'mem MiB':>9} {'peak MiB':>9}"
+    lines = [header, "-" * len(header)]
+    for record in ordered:
+        name = "  " * record["depth"] + record["name"] + (f" ({record['error']})" if record["error"] else "")
+        lines.append(f"{name:<72} {record['wall_seconds']:>9.3f} {record['cpu_seconds']:>9.3f} {number(record['rows_in']):>11} "
+                     f"{number(record['rows_out']):>11} {number(record['memory_delta_bytes'], 2 ** 20, '{:,.1f}'):>9} "
+                     f"{number(record['memory_peak_bytes'], 2 ** 20, '{:,.1f}'):>9}")
+    return "\n".join(lines)
+
+def _start_order(stage_records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Finish order to start order: every stage is followed by the stages that ran inside it."""
+    subtrees: List[List[Dict[str, Any]]] = []
+    for record in stage_records:
+        # Deeper subtrees finished since the last stage of this depth are the ones that ran inside this stage.
+        children = 0
+        while children < len(subtrees) and subtrees[-1 - children][0]["depth"] > record["depth"]:
+            children += 1
+        inner = subtrees[len(subtrees) - children:]
+        del subtrees[len(subtrees) - children:]
+        subtrees.append([record] + [inner_record for subtree in inner for inner_record in subtree])
+    return [record for subtree in subtrees for record in subtree]
+
+def write_trace(path: str, stage_records: Optional[List[Dict[str, Any]]] = None) -> None:
+    """Writes the stages of the run (in the order they finished) as a JSON trace."""
+    stage_records = _RECORDS if stage_records is None else stage_records
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "profile": _PROFILE, "tracemalloc": _TRACE_MEMORY,
+                   "stages": stage_records}, file, indent=2)
+
+def report(trace_path: Optional[str] = None) -> None:
+    """
+    End of run: prints the summary table and writes the JSON trace (to trace_path, or PEWDIEPIE_TRACE,
+    or instrumentation_trace.json). Does nothing when instrumentation is off.
+    """
+    if not _ENABLED:
+        return
+    print(summary_table())
+    for record in _RECORDS:
+        if record.get("profile"):
+            print(f"\nProfile of {record['name']}:\n{record['profile']}")
+    write_trace(trace_path or os.environ.get("PEWDIEPIE_TRACE", "instrumentation_trace.json"))
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+from typing import Any, Optional
+import numpy as np
+import pandas as pd
+from durations import parse_durations
+from instrumentation import instrumented, stage
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # Without pyarrow the CSV is parsed every time, just without the sidecar.
+    feather = None
+
+# Bump this when the typed columns below change, so old sidecars are rebuilt.
+SIDECAR_VERSION = 1
+SIDECAR_SUFFIX = ".cache.feather"
+
+# Text columns are read as plain strings, categories are dictionary encoded.
+STRING_COLUMNS = ["video_id", "title", "duration"]
+CATEGORY_COLUMNS = ["category_name", "category_name_gpt"]
+COUNTER_COLUMNS = ["views", "likes", "comments"]
+
+
+def file_fingerprint(path: str) -> dict:
+    """Returns the size and modification time of a file, which is enough to notice most changes without reading it."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """Returns the sha256 of a file, read in chunks so big exports do not have to fit in memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def video_csv_dtypes(path: str, category_dtype: str = "category") -> dict:
+    """Explicit read_csv dtypes for the columns of a video CSV that are not converted afterwards."""
+    header = pd.read_csv(path, nrows=0, encoding="utf-8").columns
+    dtypes = {column: "str" for column in STRING_COLUMNS + ["published_at"] if column in header}
+    dtypes.update({column: category_dtype for column in CATEGORY_COLUMNS if column in header})
+    return dtypes
+
+@instrumented
+def type_video_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Converts counters, published_at and duration of a freshly read video table (whole file or one chunk) in place."""
+    with stage("loader.to_numeric", len(df)):
+        for column in COUNTER_COLUMNS:
+            if column in df.columns and not pd.api.types.is_integer_dtype(df[column]):
+                # Making sure quantitative data is numeric (integer).
+                values = pd.to_numeric(df[column], errors="coerce")
+                df[column] = values.astype(np.int64) if values.notna().all() else values
+    with stage("loader.to_datetime", len(df)):
+        df["published_at"] = pd.to_datetime(df["published_at"], utc=True, format="ISO8601")
+    if "duration" in df.columns:
+        df[["duration_seconds", "duration_minutes"]] = parse_durations(df["duration"])
+    return df
+
+@instrumented
+def read_videos_csv(path: str) -> pd.DataFrame:
+    """
+    Reads a video CSV (output of data_structuring.py, with or without category_name_gpt) with explicit dtypes.
+    - views, likes, comments are int64 (float64 only if some values are missing or not numbers)
+    - category_name and category_name_gpt are categorical
+    - published_at is a timezone aware (UTC) datetime
+    - duration_seconds and duration_minutes are computed once from duration
+    """
+    with stage("loader.read_csv") as current:
+        df = pd.read_csv(path, encoding="utf-8", dtype=video_csv_dtypes(path))
+        current.rows_out = len(df)
+    return type_video_columns(df)
+
+def write_json_atomic(path: str, data: Any) -> None:
+    # Write to a temporary file first so an interrupted run never leaves a half written file behind.
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    os.replace(path + ".tmp", path)
+
+def _sidecar_paths(path: str, cache_dir: Optional[str]) -> tuple:
+    directory = cache_dir if cache_dir is not None else os.path.dirname(os.path.abspath(path))
+    base = os.path.join(directory, os.path.basename(path) + SIDECAR_SUFFIX)
+    return base, base + ".json"
+
+def _sidecar_is_fresh(meta_path: str, path: str, fingerprint: dict) -> bool:
+    """The sidecar is fresh if it was built from the same file: same size and mtime, or failing that, the same hash."""
+    try:
+        with open(meta_path, encoding="utf-8") as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return False
+    if meta.get("version") != SIDECAR_VERSION or meta.get("size") != fingerprint["size"]:
+        return False
+    if meta.get("mtime_ns") == fingerprint["mtime_ns"]:
+        return True
+    # Same size but touched (ex: git checkout), only then is the whole file hashed.
+    if meta.get("sha256") != file_hash(path):
+        return False
+    write_json_atomic(meta_path, {**meta, **fingerprint})  # Remember the new mtime so the next load skips hashing.
+    return True
+
+@instrumented
+def load_videos(path: str = "pewdiepie_videos_gpt.csv", cache_dir: Optional[str] = None, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Loads the video CSV as a typed DataFrame (see read_videos_csv).
+    The first load writes a Feather sidecar next to the CSV (or in cache_dir), keyed on the CSV's size, mtime and sha256.
+    Later loads read the sidecar, memory mapped, instead of parsing the CSV again. The sidecar is rebuilt when the CSV changes.
+    """
+    if not use_cache or feather is None:
+        return read_videos_csv(path)
+
+    sidecar_path, meta_path = _sidecar_paths(path, cache_dir)
+    fingerprint = file_fingerprint(path)
+    if os.path.exists(sidecar_path) and _sidecar_is_fresh(meta_path, path, fingerprint):
+        try:
+            return feather.read_feather(sidecar_path, memory_map=True)
+        except (OSError, ValueError):
+            pass  # Broken sidecar, parse the CSV again and overwrite it.
+
+    df = read_videos_csv(path)
+    os.makedirs(os.path.dirname(sidecar_path), exist_ok=True)
+    feather.write_feather(df, sidecar_path + ".tmp")
+    os.replace(sidecar_path + ".tmp", sidecar_path)
+    write_json_atomic(meta_path, {"version": SIDECAR_VERSION, **fingerprint, "sha256": file_hash(path)})
+    return df
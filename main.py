@@ -1,61 +1,143 @@
-import pandas as pd
-from typing import List, Dict, Any
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
-import isodate
-from data_analysis_barcharts import number_of_videos_per_category_gpt, number_of_videos_per_year
-from data_analysis_time_series import category_views_gpt, monthly_video_upload_count_category_gpt, monthly_video_length_sum_category_gpt, monthly_likes_sum_category_gpt, monthly_comments_sum_category_gpt
-from descriptive_analysis import total_descriptive_analysis
-
-
-def parse_duration_to_minutes(duration: str) -> int:
-    """
-    Function to parse and convert duration to minutes.
-    isodate takes isodate duration format (ex: PT29M9S)
-    and turns it into mathmetical number.
-    """
-    parsed_duration = isodate.parse_duration(duration)
-    return int(parsed_duration.total_seconds() // 60)  # Convert seconds to minutes
+"""
+You can access to all the functions I have written through these files:
+- data_analysis_time_series.py
+- data_analysis_barcharts.py
+- descriptive_analysis.py
+- rendering.py (saves every figure to photos/ without a display, in parallel)
+- streaming.py (same time series plots and descriptive report, read chunk by chunk for CSVs that do not fit in memory)
+- video_store.py (SQLite store of fetched videos, the aggregates above as queries with the filters pushed into the database)
+- relabel.py (assigns category_name_gpt to newly fetched videos, cached so only new titles are labelled)
+- rolling_engagement.py (7/30/90 day and last N upload windows of views, likes, comments, engagement ratios and upload cadence)
+- distribution_analysis.py (skewness, kurtosis, Pearson/Spearman correlations and log-scale histograms per category and year, mergeable across chunks)
+I did not use all the functions in my analysis. I did not have enough space in my report.
+Run with PEWDIEPIE_INSTRUMENT=1 to get the time, CPU time, rows and memory of every stage at the end
+(PEWDIEPIE_PROFILE=1 and PEWDIEPIE_TRACEMALLOC=1 add cProfile and tracemalloc captures, see instrumentation.py).
+Usage (the heavy libraries are only imported by the commands that need them, `report` never loads matplotlib):
+python main.py [analyze]   plots, then the descriptive report (what this file always did)
+python main.py report      descriptive report only, add --shape for skewness, kurtosis and correlations
+python main.py plot        plots only, or --output-dir photos to save the whole figure set without a display
+python main.py fetch       fetches the videos from the YouTube API (see data_structuring.py)
+"""
+import argparse
+import sys
+from typing import Any, Optional
+from instrumentation import report, stage
 
+DEFAULT_CSV = "pewdiepie_videos_gpt.csv"
+COMMANDS = ("analyze", "report", "plot", "fetch")
 
-if __name__ == "__main__":
-    """
-    You can access to all the functions I have written through these files:
-    - data_analysis_time_series.py
-    - data_analysis_barcharts.py
-    - descriptive_analysis.py
-    I did not use all the functions in my analysis. I did not have enough space in my report.
-    """
-    df = pd.read_csv("pewdiepie_videos_gpt.csv", encoding='utf-8')
-    # df = df[pd.to_datetime(df['published_at']).dt.year >= 2022] # Enable this to look at videos just after 2022
-    df = df[df['category_name_gpt'].isin(df['category_name_gpt'].value_counts().head(5).index)] # Enable this to see most occuring 5 video categories
+
+def load_context(path: str = DEFAULT_CSV, since_year: Optional[int] = None, top_categories: Optional[int] = 5) -> Any:
+    """Loads the videos and returns the AnalysisContext the plots and the report work on."""
+    from analysis_context import AnalysisContext
+    from loader import load_videos
+    # Typed columns (int64 counters, categorical categories, UTC datetimes, duration in seconds and minutes).
+    # Parsed from the CSV once, later runs read the cached sidecar.
+    with stage("main.load") as current:
+        df = load_videos(path)
+        current.rows_out = len(df)
+    # The context computes derived columns (year, month) and shared aggregates once for all the functions below.
+    # With since_year=2022 you can look at videos just after 2022, top_categories=5 keeps the most occuring 5 video categories.
+    context = AnalysisContext(df).filter(since_year=since_year, top_categories=top_categories)
 
     # Possible sampling %40 of data for more accuracy and clean data.
-    # df = df.sample(frac=0.4, random_state=42)
-
-    # Making sure quantitative data is numeric (integer).
-    df['views'] = pd.to_numeric(df['views'], errors='coerce')
-    df['likes'] = pd.to_numeric(df['likes'], errors='coerce')
-    df['comments'] = pd.to_numeric(df['comments'], errors='coerce')
-    # print(df.info())
-    # print(df.head())
-    # To see video duration in minutes I created a new column in DataFrame
-    df['duration_minutes'] = df['duration'].apply(parse_duration_to_minutes)
-    print(df.head())
-    
-    # Functions ending with "_gpt" means they are using the dataset cleaned by ChatGPT.
-    number_of_videos_per_year(df)
-    number_of_videos_per_category_gpt(df)
-    monthly_video_upload_count_category_gpt(df)
-    category_views_gpt(df)
-    monthly_video_length_sum_category_gpt(df)
-    monthly_likes_sum_category_gpt(df)
-    monthly_comments_sum_category_gpt(df)
+    # context = AnalysisContext(context.dataframe.sample(frac=0.4, random_state=42))
+    return context
 
+def plots(context: Any) -> None:
+    from data_analysis_barcharts import number_of_videos_per_category_gpt, number_of_videos_per_year
+    from data_analysis_time_series import (category_views_gpt, monthly_comments_sum_category_gpt, monthly_likes_sum_category_gpt,
+                                           monthly_video_length_sum_category_gpt, monthly_video_upload_count_category_gpt)
+    with stage("main.plots", len(context)):
+        # Functions ending with "_gpt" means they are using the dataset cleaned by ChatGPT.
+        number_of_videos_per_year(context)
+        number_of_videos_per_category_gpt(context)
+        # All monthly plots share one (category x month) aggregation.
+        monthly_video_upload_count_category_gpt(context)
+        category_views_gpt(context)
+        monthly_video_length_sum_category_gpt(context)
+        monthly_likes_sum_category_gpt(context)
+        monthly_comments_sum_category_gpt(context)
+
+def descriptive_report(context: Any, approximate: bool = False, shape: bool = False) -> None:
+    from descriptive_analysis import total_descriptive_analysis
     # Some videos are premium. That gives 0 views, likes, comments since API does not access views of premium videos.
     # For cleaner data I took edge low cases out out. I guess some videos were not open to commenting before, and this left them in 0 comment.
-    df = df[df['views'] > 0]
-    df = df[df['likes'] > 0]
-    df = df[df['comments'] > 100]
-    total_descriptive_analysis(df)
+    context = context.filter(views_over=0, likes_over=0, comments_over=100)
+    with stage("main.descriptive_report", len(context)):
+        # With approximate, medians and IQRs come from quantile sketches (bounded memory).
+        total_descriptive_analysis(context, approximate=approximate, error=0.01)
+        if shape:
+            # Skewness and kurtosis per category and year, and the correlations (see distribution_analysis.py).
+            from distribution_analysis import distribution_analysis
+            summary = distribution_analysis(context)
+            print(summary.shape().to_string(index=False))
+            print(summary.pearson().round(3).to_string())
+            print(summary.spearman().round(3).to_string())
+
+
+def analyze(args: argparse.Namespace) -> None:
+    context = load_context(args.path, args.since_year, args.top_categories)
+    # print(context.dataframe.info())
+    print(context.dataframe.head())
+    plots(context)
+    descriptive_report(context, args.approximate, args.shape)
+
+def report_command(args: argparse.Namespace) -> None:
+    descriptive_report(load_context(args.path, args.since_year, args.top_categories), args.approximate, args.shape)
+
+def plot_command(args: argparse.Namespace) -> None:
+    if args.output_dir is None:
+        plots(load_context(args.path, args.since_year, args.top_categories))
+        return
+    # The whole figure set of photos/ (its own filters), drawn in parallel without a display.
+    from loader import load_videos
+    from rendering import render_all
+    for path in render_all(load_videos(args.path), args.output_dir, args.format, args.processes):
+        print(path)
+
+def fetch_command(args: argparse.Namespace) -> None:
+    from data_structuring import fetch_pewdiepie_videos
+    print(fetch_pewdiepie_videos(args.output, args.incremental, args.recent_days, args.store).head())
+
+def build_parser() -> argparse.ArgumentParser:
+    data = argparse.ArgumentParser(add_help=False)
+    data.add_argument("path", nargs="?", default=DEFAULT_CSV)
+    data.add_argument("--since-year", type=int, default=None, help="only videos published from this year on")
+    data.add_argument("--top-categories", type=int, default=5, help="only the most occuring N categories (0 for all)")
+    statistics = argparse.ArgumentParser(add_help=False)
+    statistics.add_argument("--approximate", action="store_true", help="medians and IQRs from quantile sketches")
+    statistics.add_argument("--shape", action="store_true", help="also print skewness, kurtosis and correlations")
+
+    parser = argparse.ArgumentParser(description="PewDiePie video analysis.")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("analyze", parents=[data, statistics], help="plots and descriptive report (default)").set_defaults(run=analyze)
+    commands.add_parser("report", parents=[data, statistics], help="descriptive report only, no plotting libraries").set_defaults(run=report_command)
+    plot = commands.add_parser("plot", parents=[data], help="plots only")
+    plot.add_argument("--output-dir", default=None, help="save the whole figure set here instead of showing the plots")
+    plot.add_argument("--format", default="png", choices=["png", "svg", "pdf"])
+    plot.add_argument("--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+    plot.set_defaults(run=plot_command)
+    fetch = commands.add_parser("fetch", help="fetch the videos from the YouTube API")
+    fetch.add_argument("--output", default="pewdiepie_videos.csv")
+    fetch.add_argument("--incremental", action="store_true", help="only fetch new and recent videos and merge them into the existing CSV")
+    fetch.add_argument("--recent-days", type=int, default=30, help="videos published in this many days are fetched again (default: 30)")
+    fetch.add_argument("--store", default=None, help="also insert or update the videos in this SQLite store (see video_store.py)")
+    fetch.set_defaults(run=fetch_command)
+    return parser
+
+def main(argv: Optional[list] = None) -> None:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in COMMANDS + ("-h", "--help"):
+        # No command runs the whole analysis, like this file always did (python main.py --since-year 2022 too).
+        argv = ["analyze"] + argv
+    args = build_parser().parse_args(argv)
+    if getattr(args, "top_categories", None) == 0:
+        args.top_categories = None
+    args.run(args)
+    # Summary table and JSON trace of the stages above, only when instrumentation is on.
+    report()
+
+
+if __name__ == "__main__":
+    main()
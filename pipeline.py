@@ -0,0 +1,157 @@
+import argparse
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+import pandas as pd
+
+# Channel ids are 24 characters starting with "UC", anything else is looked up as a channel name.
+CHANNEL_ID_REGEX = re.compile(r"^UC[0-9A-Za-z_-]{22}$")
+# API requests per second of the whole pipeline (the TokenBucket default of data_structuring.py), shared by the worker processes.
+DEFAULT_RATE = 5.0
+
+
+def channel_directory(output_root: str, channel: str) -> str:
+    """Output folder of one channel, named after the channel with characters that are unsafe in paths replaced."""
+    return os.path.join(output_root, re.sub(r"[^0-9A-Za-z_.-]+", "_", channel).strip("_") or "channel")
+
+def fetch_channel(channel: str, directory: str, incremental: bool = False, recent_days: int = 30, max_workers: int = 4,
+                  rate: float = DEFAULT_RATE) -> str:
+    """
+    Fetch stage: crawls every video of the channel (name or id) into directory/videos.csv and returns the path.
+    With incremental, an existing videos.csv is only refreshed (see data_structuring.refresh_videos).
+    All requests of the channel's threads share one limiter of `rate` requests per second.
+    """
+    # Imported here so the YouTube client is only built in the worker process that fetches.
+    from data_structuring import (PUBLISHED_AT_FORMAT, TokenBucket, build_youtube_client, fetch_video_records, get_channel_id,
+                                  get_pewdiepie_all_video_ids, get_pewdiepie_uploads_playlist, get_video_categories, refresh_videos)
+    client = build_youtube_client()
+    rate_limiter = TokenBucket(rate)
+    channel_id = channel if CHANNEL_ID_REGEX.match(channel) else get_channel_id(channel, client)
+    uploads_playlist_id = get_pewdiepie_uploads_playlist(channel_id, client)
+
+    csv_path = os.path.join(directory, "videos.csv")
+    checkpoint_dir = os.path.join(directory, "fetch_checkpoint")
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    if incremental and os.path.exists(csv_path):
+        existing = pd.read_csv(csv_path, encoding="utf-8", dtype={"video_id": str, "category_id": str})
+        videos = refresh_videos(existing, uploads_playlist_id, recent_days, client=client, client_factory=build_youtube_client,
+                                max_workers=max_workers, rate_limiter=rate_limiter, checkpoint_dir=checkpoint_dir)
+    else:
+        video_ids = get_pewdiepie_all_video_ids(uploads_playlist_id, client=client, rate_limiter=rate_limiter,
+                                                checkpoint_path=os.path.join(checkpoint_dir, "video_ids.json"))
+        records = fetch_video_records(video_ids, build_youtube_client, max_workers, rate_limiter, checkpoint_dir=checkpoint_dir)
+        videos = records.to_dataframe(get_video_categories(client)).drop(columns="duration_seconds")
+    videos.to_csv(csv_path, index=False, encoding="utf-8", date_format=PUBLISHED_AT_FORMAT)
+    shutil.rmtree(checkpoint_dir)  # The crawl finished, so the next run starts from scratch.
+    return csv_path
+
+def clean_videos(csv_path: str, label_cache: Optional[str] = None) -> pd.DataFrame:
+    """
+    Clean, duration parse and relabel stage: typed load (numeric counters, UTC dates, duration in seconds and minutes),
+    then category_name_gpt for the videos that do not have one yet, from the default relabel model.
+    Labels are cached in label_cache (category_labels.sqlite next to the CSV by default), so refreshes only label new titles.
+    """
+    from loader import load_videos
+    from relabel import relabel_videos
+    videos = load_videos(csv_path)
+    if "category_name_gpt" not in videos.columns or videos["category_name_gpt"].isna().any():
+        label_cache = label_cache or os.path.join(os.path.dirname(csv_path), "category_labels.sqlite")
+        videos = relabel_videos(videos, cache_path=label_cache)
+    return videos
+
+def channel_summary(channel: str, videos: pd.DataFrame, statistics: pd.DataFrame) -> Dict[str, Any]:
+    """One row of the cross channel summary table."""
+    views = statistics[statistics["metric"] == "views"].iloc[0] if len(statistics) else None
+    return {
+        "channel": channel,
+        "videos": len(videos),
+        "first_upload": videos["published_at"].min(),
+        "last_upload": videos["published_at"].max(),
+        "total_views": int(videos["views"].sum()),
+        "total_likes": int(videos["likes"].sum()),
+        "total_comments": int(videos["comments"].sum()),
+        "total_minutes": int(videos["duration_minutes"].sum()),
+        "top_category": videos["category_name_gpt"].value_counts().index[0] if len(videos) else None,
+        "mean_views": views["mean"] if views is not None else None,
+        "median_views": views["median"] if views is not None else None,
+        "iqr_views": views["iqr"] if views is not None else None,
+        "error": None,
+    }
+
+def run_channel(channel: str, output_root: str = "channels", incremental: bool = False, recent_days: int = 30,
+                max_workers: int = 4, render: bool = True, fmt: str = "png", store_path: Optional[str] = None,
+                rate: float = DEFAULT_RATE) -> Dict[str, Any]:
+    """
+    Runs fetch -> clean -> duration parse -> relabel -> aggregate -> render for one channel into its own folder:
+    videos.csv, statistics.csv (descriptive statistics per category, main.py filters) and figures/.
+    With store_path the cleaned videos are also upserted into that SQLite store (shared by every channel, see video_store.py).
+    rate is this channel's share of the API requests per second (see run_pipeline).
+    Returns the channel's row of the summary table. Errors are returned in the row instead of raised,
+    so one failing channel does not stop the others.
+    """
+    directory = channel_directory(output_root, channel)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        from analysis_context import AnalysisContext
+        from descriptive_analysis import describe_metrics
+
+        videos = clean_videos(fetch_channel(channel, directory, incremental, recent_days, max_workers, rate))
+        if store_path is not None:
+            from video_store import VideoStore
+            with VideoStore(store_path) as store:
+                store.upsert(videos, channel)
+        context = AnalysisContext(videos)
+        # Same filters as main.py: the most occuring 5 categories, then no premium or closed comment videos.
+        statistics_context = context.filter(top_categories=5, views_over=0, likes_over=0, comments_over=100)
+        statistics = pd.concat([describe_metrics(statistics_context.dataframe),
+                                describe_metrics(statistics_context.dataframe, by="category_name_gpt")], ignore_index=True)
+        statistics.to_csv(os.path.join(directory, "statistics.csv"), index=False, encoding="utf-8")
+        if render:
+            from rendering import render_all
+            # Channels already run in parallel, so the figures of one channel are drawn in its own process.
+            render_all(context, os.path.join(directory, "figures"), fmt, processes=1)
+        overall = statistics[statistics["category_name_gpt"].isna()]
+        return channel_summary(channel, videos, overall)
+    except Exception as error:
+        return {"channel": channel, "error": f"{type(error).__name__}: {error}"}
+
+def run_pipeline(channels: Sequence[str], output_root: str = "channels", processes: Optional[int] = None, rate: float = DEFAULT_RATE,
+                 **channel_options: Any) -> pd.DataFrame:
+    """
+    Runs every channel (names or ids) through run_channel on a pool of worker processes (all cores by default),
+    then writes the combined cross channel summary to output_root/summary.csv and returns it.
+    rate is the API requests per second of the whole pipeline: every worker process gets an equal share of it,
+    so running more channels at once does not multiply the request rate.
+    """
+    os.makedirs(output_root, exist_ok=True)
+    processes = max(1, min(processes or os.cpu_count() or 1, len(channels)))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(run_channel, channel, output_root, rate=rate / processes, **channel_options) for channel in channels]
+        rows: List[Dict[str, Any]] = [future.result() for future in futures]
+    summary = pd.DataFrame(rows)
+    summary.to_csv(os.path.join(output_root, "summary.csv"), index=False, encoding="utf-8")
+    return summary
+
+
+if __name__ == "__main__":
+    """
+    Same analysis as data_structuring.py and main.py, for many channels at once:
+    python pipeline.py PewDiePie UC-lHJZR3Gqxm24_Vd_AJ5Yw --output-dir channels
+    """
+    parser = argparse.ArgumentParser(description="Fetch, analyze and render many YouTube channels in parallel.")
+    parser.add_argument("channels", nargs="+", help="channel names or channel ids (UC...)")
+    parser.add_argument("--output-dir", default="channels")
+    parser.add_argument("--processes", type=int, default=None, help="channels processed at the same time (default: all cores)")
+    parser.add_argument("--incremental", action="store_true", help="only fetch new and recent videos of channels fetched before")
+    parser.add_argument("--recent-days", type=int, default=30)
+    parser.add_argument("--no-render", action="store_true", help="skip the figures")
+    parser.add_argument("--format", default="png", choices=["png", "svg", "pdf"])
+    parser.add_argument("--store", default=None, help="SQLite store every channel's videos are upserted into (see video_store.py)")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="API requests per second of all channels together")
+    args = parser.parse_args()
+
+    summary = run_pipeline(args.channels, args.output_dir, args.processes, args.rate, incremental=args.incremental,
+                           recent_days=args.recent_days, render=not args.no_render, fmt=args.format, store_path=args.store)
+    print(summary.to_string(index=False))
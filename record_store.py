@@ -0,0 +1,119 @@
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from durations import duration_seconds
+
+COUNTER_COLUMNS = ["views", "likes", "comments"]
+COUNTER_KEYS = ["viewCount", "likeCount", "commentCount"]  # Same order, names in the statistics of an API item
+# pandas stores the codes of fewer than 128 categories as int8, so int8 codes become a Categorical without a copy.
+# YouTube has about 30 video categories, the codes are widened only if a store ever sees more.
+CODE_DTYPES = [(127, np.int8), (32767, np.int16), (2 ** 31 - 1, np.int32)]
+
+
+def _code_dtype(categories: int) -> np.dtype:
+    return next(dtype for limit, dtype in CODE_DTYPES if categories <= limit)
+
+
+class VideoRecordStore:
+    """
+    Video details kept in typed columns instead of one dict of strings per video:
+    - views, likes, comments in one (3 x n) int64 array
+    - duration in int32 seconds, published_at in datetime64[s] (UTC)
+    - category_id dictionary encoded (int8 codes into the list of distinct ids)
+    - video_id, title and the ISO 8601 duration as the str objects of the API response
+    Arrays are presized (capacity) and grow by doubling. to_dataframe() wraps the arrays without copying them.
+    """
+    def __init__(self, capacity: int = 1024):
+        capacity = max(capacity, 1)
+        self.size = 0
+        self.counters = np.zeros((len(COUNTER_COLUMNS), capacity), dtype=np.int64)
+        self.duration_seconds = np.zeros(capacity, dtype=np.int32)
+        self.published_at = np.zeros(capacity, dtype="datetime64[s]")
+        self.category_codes = np.zeros(capacity, dtype=np.int8)
+        self.category_ids: List[str] = []
+        self._category_index: Dict[str, int] = {}
+        self.video_ids: List[str] = []
+        self.titles: List[str] = []
+        self.durations: List[str] = []
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _reserve(self, size: int) -> None:
+        capacity = self.counters.shape[1]
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity)
+        counters = np.zeros((len(COUNTER_COLUMNS), capacity), dtype=np.int64)
+        counters[:, :self.size] = self.counters[:, :self.size]
+        self.counters = counters
+        for name in ("duration_seconds", "published_at", "category_codes"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _category_code(self, category_id: str) -> int:
+        code = self._category_index.get(category_id)
+        if code is None:
+            code = self._category_index[category_id] = len(self.category_ids)
+            self.category_ids.append(category_id)
+            if self.category_codes.dtype != _code_dtype(len(self.category_ids)):
+                self.category_codes = self.category_codes.astype(_code_dtype(len(self.category_ids)))
+        return code
+
+    def append_items(self, items: Iterable[Dict[str, Any]]) -> None:
+        """Appends the video items of one API response (videos().list with snippet, statistics and contentDetails)."""
+        items = list(items)
+        if not items:
+            return
+        start, end = self.size, self.size + len(items)
+        self._reserve(end)
+        for row, key in enumerate(COUNTER_KEYS):
+            # Premium videos have no public statistics, they count as 0 like in _video_details.
+            self.counters[row, start:end] = [int(item["statistics"].get(key, 0)) for item in items]
+        durations = [item["contentDetails"]["duration"] for item in items]
+        self.duration_seconds[start:end] = np.floor(duration_seconds(pd.Series(durations, dtype=object)))
+        # publishedAt is UTC with a Z suffix (2025-03-14T17:00:36Z).
+        self.published_at[start:end] = np.array([item["snippet"]["publishedAt"].rstrip("Z") for item in items], dtype="datetime64[s]")
+        codes = [self._category_code(str(item["snippet"]["categoryId"])) for item in items]
+        self.category_codes[start:end] = codes
+        self.video_ids.extend(item["id"] for item in items)
+        self.titles.extend(item["snippet"]["title"] for item in items)
+        self.durations.extend(durations)
+        self.size = end
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of the typed arrays (capacity included), not counting the video_id, title and duration strings."""
+        return self.counters.nbytes + self.duration_seconds.nbytes + self.published_at.nbytes + self.category_codes.nbytes
+
+    def to_dataframe(self, category_mapping: Optional[Dict[str, str]] = None, duration_text: bool = True) -> pd.DataFrame:
+        """
+        The videos as a DataFrame with the columns of data_structuring.videos_to_dataframe, plus duration_seconds.
+        Counters, duration_seconds, published_at and the category codes are views of the store's arrays (no copy),
+        so the store must not be appended to while the DataFrame is used. published_at is datetime64[s] in UTC (naive).
+        category_id and category_name (from category_mapping, id -> name) are categoricals sharing the same codes.
+        With duration_text, the duration column has the ISO 8601 text of the API (P1DT3H, PT29M9.5S) for the CSV.
+        """
+        size = self.size
+        codes = self.category_codes[:size]
+        columns: Dict[str, Any] = {
+            "video_id": self.video_ids,
+            "title": self.titles,
+            "published_at": self.published_at[:size],
+            "category_id": pd.Categorical.from_codes(codes, self.category_ids),
+        }
+        if duration_text:
+            columns["duration"] = self.durations
+        counters = pd.DataFrame(self.counters[:, :size].T, columns=COUNTER_COLUMNS, copy=False)
+        columns.update({column: counters[column] for column in COUNTER_COLUMNS})
+        if category_mapping is not None:
+            names = [category_mapping.get(category_id) for category_id in self.category_ids]
+            if len(set(names)) == len(names) and None not in names:
+                columns["category_name"] = pd.Categorical.from_codes(codes, names)
+            else:
+                # Unknown or shared names can not be categories, map the ids instead (copies the codes).
+                columns["category_name"] = pd.Series(pd.Categorical.from_codes(codes, self.category_ids)).map(category_mapping)
+        columns["duration_seconds"] = self.duration_seconds[:size]
+        return pd.DataFrame(columns, copy=False)
@@ -0,0 +1,240 @@
+import argparse
+import hashlib
+import math
+import os
+import re
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+# Labelled videos the default model learns from (category_name_gpt was assigned by hand with ChatGPT), next to this file.
+TRAINING_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pewdiepie_videos_gpt.csv")
+DEFAULT_BATCH_SIZE = 256
+TOKEN_REGEX = re.compile(r"[a-z0-9']+")
+
+
+def title_hash(title: str, category_name: str) -> str:
+    """Hash of what a label depends on. A video whose title or YouTube category changes gets a new hash, so it is labelled again."""
+    return hashlib.sha1(f"{title}\x1f{category_name}".encode("utf-8")).hexdigest()
+
+def tokens(title: str, category_name: str) -> List[str]:
+    """Words and word pairs of the title, plus the YouTube category as its own token."""
+    words = TOKEN_REGEX.findall(str(title).lower())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])] + [f"category={category_name}"]
+
+
+class CategoryClassifier(ABC):
+    """
+    Interface of the labelling backends: predict() gets a batch of distinct (title, category_name) pairs
+    and returns one category_name_gpt label per pair. `name` is stored with the cached labels.
+    """
+    name = "classifier"
+
+    @abstractmethod
+    def predict(self, titles: Sequence[str], category_names: Sequence[str]) -> List[str]:
+        """One label per (title, category_name) pair, in the same order."""
+
+
+class YouTubeCategoryClassifier(CategoryClassifier):
+    """Keeps the YouTube category, what the pipeline did before relabelling existed (no training data needed)."""
+    name = "youtube_category"
+
+    def predict(self, titles: Sequence[str], category_names: Sequence[str]) -> List[str]:
+        return [str(category_name) for category_name in category_names]
+
+
+class TfidfClassifier(CategoryClassifier):
+    """
+    Local keyword model: TF-IDF weights of title words, word pairs and the YouTube category, and one centroid per label
+    (the mean of the normalized vectors of its training titles). A title gets the label whose centroid is the most similar.
+    Titles with no known token get the YouTube category if it is a label, otherwise the most common label.
+    """
+    name = "tfidf"
+
+    def __init__(self, min_count: int = 2):
+        self.min_count = min_count
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = np.empty(0)
+        self.labels: List[str] = []
+        self.centroids = np.empty((0, 0))
+        self.most_common: Optional[str] = None
+
+    def _features(self, titles: Sequence[str], category_names: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sparse (row, token, weight) triplets of the L2 normalized TF-IDF vectors of the titles."""
+        rows, columns, counts = [], [], []
+        for row, (title, category_name) in enumerate(zip(titles, category_names)):
+            for token, count in Counter(tokens(title, category_name)).items():
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    counts.append(count)
+        rows, columns = np.asarray(rows, dtype=np.int64), np.asarray(columns, dtype=np.int64)
+        weights = np.asarray(counts, dtype=np.float64) * self.idf[columns]
+        norms = np.zeros(len(titles))
+        np.add.at(norms, rows, weights ** 2)
+        return rows, columns, weights / np.sqrt(norms[rows])
+
+    def fit(self, titles: Sequence[str], category_names: Sequence[str], labels: Sequence[str]) -> "TfidfClassifier":
+        document_counts = Counter(token for title, category_name in zip(titles, category_names) for token in set(tokens(title, category_name)))
+        self.vocabulary = {token: i for i, token in enumerate(sorted(token for token, count in document_counts.items() if count >= self.min_count))}
+        self.idf = np.array([math.log((1 + len(titles)) / (1 + document_counts[token])) + 1 for token in self.vocabulary])
+        label_codes, self.labels = pd.factorize(pd.Series(labels, dtype=object))
+        self.labels = list(self.labels)
+        rows, columns, weights = self._features(titles, category_names)
+        self.centroids = np.zeros((len(self.labels), len(self.vocabulary)))
+        np.add.at(self.centroids, (label_codes[rows], columns), weights)
+        self.centroids /= np.maximum(np.linalg.norm(self.centroids, axis=1, keepdims=True), 1e-12)
+        self.most_common = self.labels[int(np.bincount(label_codes).argmax())]
+        return self
+
+    def predict(self, titles: Sequence[str], category_names: Sequence[str]) -> List[str]:
+        rows, columns, weights = self._features(titles, category_names)
+        scores = np.zeros((len(titles), len(self.labels)))
+        np.add.at(scores, rows, self.centroids[:, columns].T * weights[:, None])
+        predictions = [self.labels[i] for i in scores.argmax(axis=1)]
+        known = np.bincount(rows, minlength=len(titles)) > 0
+        for i in np.flatnonzero(~known):
+            predictions[i] = str(category_names[i]) if str(category_names[i]) in self.labels else self.most_common
+        return predictions
+
+
+class ExternalClassifier(CategoryClassifier):
+    """
+    Backend for an external labeller (ex: a language model API). send_batch gets a list of
+    {"title": ..., "category_name": ...} requests and returns their labels in the same order.
+    No service is configured here, so send_batch is required.
+    """
+    name = "external"
+
+    def __init__(self, send_batch: Callable[[List[Dict[str, str]]], List[str]], name: str = "external"):
+        if send_batch is None:
+            raise ValueError("No external labeller is configured, pass send_batch to ExternalClassifier.")
+        self.send_batch = send_batch
+        self.name = name
+
+    def predict(self, titles: Sequence[str], category_names: Sequence[str]) -> List[str]:
+        labels = self.send_batch([{"title": str(title), "category_name": str(category_name)} for title, category_name in zip(titles, category_names)])
+        if len(labels) != len(titles):
+            raise ValueError(f"The external labeller returned {len(labels)} labels for {len(titles)} titles.")
+        return list(labels)
+
+
+def default_classifier(training_csv: str = TRAINING_CSV) -> CategoryClassifier:
+    """The TF-IDF model trained on the labelled CSV, or the YouTube category when there is no labelled data."""
+    if not os.path.exists(training_csv):
+        return YouTubeCategoryClassifier()
+    labelled = pd.read_csv(training_csv, encoding="utf-8", usecols=["title", "category_name", "category_name_gpt"], dtype=str).dropna()
+    return TfidfClassifier().fit(labelled["title"].tolist(), labelled["category_name"].tolist(), labelled["category_name_gpt"].tolist())
+
+
+class LabelCache:
+    """Labels already given, in SQLite, keyed by (video_id, title_hash) so only new or changed titles are labelled again."""
+    def __init__(self, path: str = "category_labels.sqlite"):
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS labels (video_id TEXT NOT NULL, title_hash TEXT NOT NULL, "
+                                "category_name_gpt TEXT NOT NULL, source TEXT NOT NULL, PRIMARY KEY (video_id, title_hash))")
+
+    def __enter__(self) -> "LabelCache":
+        return self
+
+    def __exit__(self, error_type, error, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get(self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """Cached labels of the (video_id, title_hash) keys that are in the cache."""
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (video_id TEXT, title_hash TEXT)")
+        with self.connection:
+            self.connection.execute("DELETE FROM wanted")
+            self.connection.executemany("INSERT INTO wanted VALUES (?, ?)", keys)
+        rows = self.connection.execute("SELECT labels.video_id, labels.title_hash, labels.category_name_gpt FROM wanted "
+                                       "JOIN labels ON labels.video_id = wanted.video_id AND labels.title_hash = wanted.title_hash")
+        return {(video_id, hashed): label for video_id, hashed, label in rows}
+
+    def put(self, rows: Iterable[Tuple[str, str, str, str]]) -> None:
+        """Stores (video_id, title_hash, label, source) rows, replacing older labels of the same key."""
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?)", rows)
+
+
+@instrumented
+def relabel_videos(dataframe: pd.DataFrame, classifier: Optional[CategoryClassifier] = None, cache_path: str = "category_labels.sqlite",
+                   batch_size: int = DEFAULT_BATCH_SIZE, keep_existing: bool = True) -> pd.DataFrame:
+    """
+    Relabelling stage: fills category_name_gpt from title and category_name (output of data_structuring.py).
+    - labels already in the cache for the same video_id and title hash are reused
+    - with keep_existing, labels the table already has (ex: the hand made ones) are kept and cached
+    - the other rows are deduplicated by (title, category_name) and sent to the classifier in batches of batch_size
+      (the default model is only trained when there are such rows)
+    Returns a copy with a categorical category_name_gpt column.
+    """
+    video_ids = dataframe["video_id"].astype(str).tolist()
+    titles = dataframe["title"].fillna("").astype(str).tolist()
+    category_names = dataframe["category_name"].astype(object).fillna("").astype(str).tolist()
+    hashes = [title_hash(title, category_name) for title, category_name in zip(titles, category_names)]
+    keys = list(zip(video_ids, hashes))
+
+    labels: List[Optional[str]] = [None] * len(dataframe)
+    if keep_existing and "category_name_gpt" in dataframe.columns:
+        existing = dataframe["category_name_gpt"].astype(object).tolist()
+        for i, label in enumerate(existing):
+            if isinstance(label, str) and label:
+                labels[i] = label
+
+    with LabelCache(cache_path) as cache:
+        cached = cache.get(keys)
+        # Existing labels are only written when the cache does not have them yet, so a rerun writes nothing for them.
+        new_rows = [(*key, label, "existing") for key, label in zip(keys, labels) if label is not None and cached.get(key) != label]
+        missing: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            if labels[i] is None:
+                if key in cached:
+                    labels[i] = cached[key]
+                else:
+                    missing.setdefault(hashes[i], []).append(i)
+
+        # Every distinct title is classified once, however many videos share it.
+        distinct = list(missing)
+        if distinct and classifier is None:
+            classifier = default_classifier()
+        for start in range(0, len(distinct), batch_size):
+            batch = distinct[start:start + batch_size]
+            first_rows = [missing[hashed][0] for hashed in batch]
+            predictions = classifier.predict([titles[i] for i in first_rows], [category_names[i] for i in first_rows])
+            for hashed, label in zip(batch, predictions):
+                for i in missing[hashed]:
+                    labels[i] = label
+                    new_rows.append((*keys[i], label, classifier.name))
+        cache.put(new_rows)
+
+    return dataframe.assign(category_name_gpt=pd.Categorical(labels))
+
+
+if __name__ == "__main__":
+    """
+    Adds category_name_gpt to the output of data_structuring.py, keeping the labels the training CSV already has:
+    python relabel.py pewdiepie_videos.csv --output pewdiepie_videos_labelled.csv
+    """
+    parser = argparse.ArgumentParser(description="Assign category_name_gpt to fetched videos.")
+    parser.add_argument("path", nargs="?", default="pewdiepie_videos.csv")
+    parser.add_argument("--output", default="pewdiepie_videos_labelled.csv")
+    parser.add_argument("--cache", default="category_labels.sqlite")
+    parser.add_argument("--training-csv", default=TRAINING_CSV, help="labelled videos the default model learns from")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    videos = pd.read_csv(args.path, encoding="utf-8", dtype={"video_id": str, "category_id": str})
+    if "category_name_gpt" not in videos.columns and os.path.exists(args.training_csv):
+        # Videos labelled by hand keep their label (as long as the title did not change), only the others are classified.
+        labelled = pd.read_csv(args.training_csv, encoding="utf-8", usecols=["video_id", "title", "category_name_gpt"], dtype=str)
+        videos = videos.merge(labelled, on=["video_id", "title"], how="left")
+    relabelled = relabel_videos(videos, default_classifier(args.training_csv), args.cache, args.batch_size)
+    relabelled.to_csv(args.output, index=False, encoding="utf-8")
+    print(relabelled["category_name_gpt"].value_counts().to_string())
@@ -0,0 +1,95 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional, Tuple, Union
+import pandas as pd
+from instrumentation import instrumented
+
+# Every figure of the report: (file name without extension, module, plotting function, aggregate it is drawn from, subset of the data).
+# 'all' is the most occuring 5 categories, 'beyond2022' the most occuring 5 categories of videos from 2022 on.
+# File names are the ones in photos/, so the folder can be regenerated.
+FIGURES = [
+    ("number_of_videos_per_year", "data_analysis_barcharts", "number_of_videos_per_year", "yearly_counts", "all"),
+    ("number_videos_categories_gpt", "data_analysis_barcharts", "number_of_videos_per_category_gpt", "category_counts", "all"),
+    ("monthly_video_uploads_per_category_gpt", "data_analysis_time_series", "monthly_video_upload_count_category_gpt", "cube", "all"),
+    ("monthly_categoy_views_per_year_gpt", "data_analysis_time_series", "category_views_gpt", "cube", "all"),
+    ("monthly_video_minutes_per_category_gpt", "data_analysis_time_series", "monthly_video_length_sum_category_gpt", "cube", "all"),
+    ("monthly_video_likes_per_category_gpt", "data_analysis_time_series", "monthly_likes_sum_category_gpt", "cube", "all"),
+    ("monthly_video_comments_per_category_gpt", "data_analysis_time_series", "monthly_comments_sum_category_gpt", "cube", "all"),
+    ("2022/beyond2022_video_upload_5category_gpt", "data_analysis_time_series", "monthly_video_upload_count_category_gpt", "cube", "beyond2022"),
+    ("2022/beyond2022_video_views_5category_gpt", "data_analysis_time_series", "category_views_gpt", "cube", "beyond2022"),
+]
+
+
+def use_headless_backend() -> None:
+    """Switches matplotlib to the Agg backend, which draws to files and needs no display."""
+    import matplotlib
+    matplotlib.use("Agg", force=True)
+
+def finish_figure(output_path: Optional[str] = None) -> None:
+    """
+    Last step of every plotting function: shows the figure, or with output_path saves it
+    (the format comes from the extension, ex: .png or .svg) and closes it so batch runs do not pile up figures.
+    """
+    import matplotlib.pyplot as plt
+    if output_path is None:
+        plt.show()
+        return
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    plt.savefig(output_path, bbox_inches="tight")
+    plt.close()
+
+def _render_figure(task: Tuple[str, str, str, Any, str]) -> str:
+    """Worker side: draws one figure from its precomputed aggregate and saves it."""
+    import importlib
+    module_name, function_name, aggregate_name, aggregate, output_path = task
+    plot = getattr(importlib.import_module(module_name), function_name)
+    # The aggregate is passed by name (cube=, yearly_counts=, category_counts=), so the plot does not need the DataFrame.
+    plot(None, **{aggregate_name: aggregate, "output_path": output_path})
+    return output_path
+
+@instrumented
+def figure_tasks(data: Union[pd.DataFrame, Any], output_dir: str = "photos", fmt: str = "png") -> List[Tuple[str, str, str, Any, str]]:
+    """
+    The aggregates every figure needs, computed once in this process (the workers only draw).
+    data is the loaded DataFrame or an AnalysisContext around it, before any filtering.
+    """
+    from analysis_context import AnalysisContext
+    context = AnalysisContext.of(data)
+    contexts = {"all": context.filter(top_categories=5), "beyond2022": context.filter(since_year=2022, top_categories=5)}
+    aggregates = {"cube": lambda c: c.monthly_cube(), "yearly_counts": lambda c: c.yearly_counts(), "category_counts": lambda c: c.category_counts()}
+    return [(module_name, function_name, aggregate_name, aggregates[aggregate_name](contexts[subset]), os.path.join(output_dir, f"{name}.{fmt}"))
+            for name, module_name, function_name, aggregate_name, subset in FIGURES]
+
+@instrumented
+def render_all(data: Union[pd.DataFrame, Any], output_dir: str = "photos", fmt: str = "png", processes: Optional[int] = None) -> List[str]:
+    """
+    Renders the whole figure set (bar charts, five monthly series, the beyond 2022 variants) to output_dir,
+    on a pool of `processes` worker processes (all cores by default) with the headless Agg backend.
+    Returns the paths of the saved figures.
+    """
+    tasks = figure_tasks(data, output_dir, fmt)
+    if processes == 1:
+        use_headless_backend()
+        return [_render_figure(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=processes, initializer=use_headless_backend) as executor:
+        return list(executor.map(_render_figure, tasks))
+
+
+if __name__ == "__main__":
+    """
+    Renders every figure of the report without a display, for scheduled jobs.
+    """
+    from loader import load_videos
+
+    parser = argparse.ArgumentParser(description="Render all report figures to files.")
+    parser.add_argument("path", nargs="?", default="pewdiepie_videos_gpt.csv")
+    parser.add_argument("--output-dir", default="photos")
+    parser.add_argument("--format", default="png", choices=["png", "svg", "pdf"])
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    for path in render_all(load_videos(args.path), args.output_dir, args.format, args.processes):
+        print(path)
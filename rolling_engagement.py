@@ -0,0 +1,202 @@
+from typing import Dict, Hashable, Optional, Sequence, Union
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+ALL_VIDEOS = None  # Group key of the series over all videos (category is empty in the results, like in describe_metrics)
+METRICS = ("views", "likes", "comments")
+WINDOWS = ("7D", "30D", "90D")
+LAST_N = (10, 50)
+SECONDS_PER_DAY = 86400
+
+
+def _seconds(published_at: pd.Series) -> np.ndarray:
+    """published_at (string, naive or timezone aware) as int64 seconds since epoch, UTC."""
+    published_at = pd.to_datetime(published_at, utc=True).dt.tz_convert(None)
+    return published_at.to_numpy(dtype="datetime64[s]").astype(np.int64)
+
+def _window_label(window: Union[str, int]) -> str:
+    return f"last{window}" if isinstance(window, (int, np.integer)) else str(window)
+
+
+class _GroupSeries:
+    """
+    Uploads of one category (or all videos) in publish order, as running totals: prefix[i] is the sum of the first i uploads.
+    The sum over any window is then the difference of two prefix rows, whatever the window length.
+    Arrays grow by doubling, so appending newer uploads costs O(new uploads) amortized.
+    """
+    def __init__(self, metrics: int, capacity: int = 1024):
+        self.size = 0
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.prefix = np.zeros((capacity + 1, metrics), dtype=np.int64)
+
+    def _reserve(self, size: int) -> None:
+        if size <= len(self.times):
+            return
+        capacity = max(size, 2 * len(self.times))
+        times = np.empty(capacity, dtype=np.int64)
+        times[:self.size] = self.times[:self.size]
+        prefix = np.zeros((capacity + 1, self.prefix.shape[1]), dtype=np.int64)
+        prefix[:self.size + 1] = self.prefix[:self.size + 1]
+        self.times, self.prefix = times, prefix
+
+    def append(self, times: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Adds uploads (any order). Uploads older than the newest one kept so far rebuild the series, O(size) once.
+        Returns the position of every added upload in the series, in the order they were given
+        (uploads with the same time keep the order they were added in).
+        """
+        order = np.argsort(times, kind="stable")
+        times, values = times[order], values[order]
+        positions = np.arange(self.size, self.size + len(times))
+        if self.size and len(times) and times[0] < self.times[self.size - 1]:
+            # A late (older) video: merge it in and compute the running totals again.
+            old_size = self.size
+            old_values = np.diff(self.prefix[:self.size + 1], axis=0)
+            times = np.concatenate([self.times[:self.size], times])
+            values = np.concatenate([old_values, values])
+            merged_order = np.argsort(times, kind="stable")
+            times, values = times[merged_order], values[merged_order]
+            merged_positions = np.empty(len(times), dtype=np.int64)
+            merged_positions[merged_order] = np.arange(len(times))
+            positions = merged_positions[old_size:]
+            self.size = 0
+        start, end = self.size, self.size + len(times)
+        self._reserve(end)
+        self.times[start:end] = times
+        self.prefix[start + 1:end + 1] = self.prefix[start] + np.cumsum(values, axis=0)
+        self.size = end
+        given_order_positions = np.empty(len(order), dtype=np.int64)
+        given_order_positions[order] = positions
+        return given_order_positions
+
+    def windows(self, ends: np.ndarray, window: Union[str, int], stop: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Sums over the window ending at every time of `ends` (inclusive): the uploads of the last `window` days ('7D', '30D', ...)
+        or the last N uploads (int). Both bounds are found with a binary search, no loop over the windows.
+        stop (end of each window in the series, exclusive) is given for windows ending at an upload: uploads published
+        at the same time as it but added after it are then left out, like pandas rolling does. Otherwise every upload
+        published up to `ends` is in the window.
+        """
+        times = self.times[:self.size]
+        if stop is None:
+            stop = np.searchsorted(times, ends, side="right")
+        if isinstance(window, (int, np.integer)):
+            start = np.maximum(stop - window, 0)
+        else:
+            length = int(pd.Timedelta(window).total_seconds())
+            start = np.searchsorted(times, ends - length, side="right")
+        uploads = stop - start
+        sums = self.prefix[stop] - self.prefix[start]
+        # Average days between two uploads of the window, from its first to its last upload.
+        last, first = np.maximum(stop - 1, 0), np.minimum(start, max(self.size - 1, 0))
+        span = np.where(uploads > 1, times[last] - times[first], 0) if self.size else np.zeros(len(ends))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            days_per_upload = np.where(uploads > 1, span / SECONDS_PER_DAY / (uploads - 1), np.nan)
+        return {"uploads": uploads, "sums": sums, "days_per_upload": days_per_upload}
+
+
+class RollingEngagement:
+    """
+    Rolling windows of views, likes, comments, like/view and comment/view ratios and upload cadence,
+    per category and over all videos, kept up to date as videos are appended.
+    Time windows ('7D', '30D', '90D') cover the uploads published in the last days up to and including each upload,
+    count windows (ints) cover the last N uploads. Ratios are ratios of the window sums (total likes / total views).
+    Appending k newer videos costs O(k log n), so a daily refresh does not recompute the whole history.
+    """
+    def __init__(self, windows: Sequence[Union[str, int]] = WINDOWS + LAST_N, by: Optional[str] = "category_name_gpt",
+                 metrics: Sequence[str] = METRICS):
+        self.windows = list(windows)
+        self.by = by
+        self.metrics = list(metrics)
+        self.groups: Dict[Hashable, _GroupSeries] = {}
+
+    def _group(self, key: Hashable) -> _GroupSeries:
+        if key not in self.groups:
+            self.groups[key] = _GroupSeries(len(self.metrics))
+        return self.groups[key]
+
+    def _rows(self, key: Hashable, ends: np.ndarray, extra: Dict[str, np.ndarray], stop: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Every window of one group evaluated at `ends` (ending at series positions `stop` if given), as the columns of a DataFrame."""
+        group = self.groups[key]
+        columns = {} if self.by is None else {self.by: [key] * len(ends)}
+        columns.update(extra)
+        columns["published_at"] = pd.to_datetime(ends, unit="s", utc=True)
+        likes = self.metrics.index("likes") if "likes" in self.metrics else None
+        comments = self.metrics.index("comments") if "comments" in self.metrics else None
+        views = self.metrics.index("views") if "views" in self.metrics else None
+        for window in self.windows:
+            label = _window_label(window)
+            result = group.windows(ends, window, stop)
+            columns[f"uploads_{label}"] = result["uploads"]
+            for i, metric in enumerate(self.metrics):
+                columns[f"{metric}_{label}"] = result["sums"][:, i]
+            if views is not None:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    view_sums = np.where(result["sums"][:, views] > 0, result["sums"][:, views], np.nan)
+                    if likes is not None:
+                        columns[f"like_view_ratio_{label}"] = result["sums"][:, likes] / view_sums
+                    if comments is not None:
+                        columns[f"comment_view_ratio_{label}"] = result["sums"][:, comments] / view_sums
+            columns[f"days_per_upload_{label}"] = result["days_per_upload"]
+        return pd.DataFrame(columns)
+
+    def append(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Adds videos (published_at and the metric columns, missing counters count as 0) and returns the rolling
+        windows ending at each new video: rows over all videos first (empty category), then per category, in publish order.
+        Windows of videos appended before are not returned again, snapshot() gives the current values.
+        """
+        times = _seconds(dataframe["published_at"])
+        values = dataframe[self.metrics].fillna(0).to_numpy(dtype=np.int64)
+        video_ids = dataframe["video_id"].to_numpy() if "video_id" in dataframe.columns else None
+        keys = [(ALL_VIDEOS, np.arange(len(dataframe)))]
+        if self.by is not None:
+            codes, uniques = pd.factorize(dataframe[self.by], sort=True)
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            keys += [(uniques[i], order[bounds[i]:bounds[i + 1]]) for i in range(len(uniques))]
+
+        frames = []
+        for key, rows in keys:
+            positions = self._group(key).append(times[rows], values[rows])
+            order = np.argsort(times[rows], kind="stable")
+            rows, positions = rows[order], positions[order]
+            extra = {"video_id": video_ids[rows]} if video_ids is not None else {}
+            # Each window ends at the video's own position, so videos published at the same second do not count each other's later rows.
+            frames.append(self._rows(key, times[rows], extra, positions + 1))
+        return pd.concat(frames, ignore_index=True)
+
+    def snapshot(self, at: Optional[Union[str, pd.Timestamp, Sequence]] = None) -> pd.DataFrame:
+        """
+        Current windows of every group ending at `at` (one time or a sequence of times, ex: the end of every day);
+        by default at the newest upload. Useful to track the trend without keeping a row per video.
+        """
+        if not self.groups:
+            return pd.DataFrame()
+        if at is None:
+            ends = np.array([max(group.times[group.size - 1] for group in self.groups.values() if group.size)])
+        else:
+            ends = _seconds(pd.Series(pd.to_datetime(at if pd.api.types.is_list_like(at) else [at], utc=True)))
+        frames = [self._rows(key, ends, {}) for key in self.groups]
+        return pd.concat(frames, ignore_index=True)
+
+
+@instrumented
+def rolling_engagement(dataframe: pd.DataFrame, windows: Sequence[Union[str, int]] = WINDOWS + LAST_N,
+                       by: Optional[str] = "category_name_gpt", metrics: Sequence[str] = METRICS) -> pd.DataFrame:
+    """
+    Rolling windows (7, 30 and 90 days, last 10 and 50 uploads by default) ending at every video,
+    over all videos (empty category) and per category. See RollingEngagement for the columns.
+    """
+    return RollingEngagement(windows, by, metrics).append(dataframe)
+
+@instrumented
+def daily_engagement(dataframe: pd.DataFrame, windows: Sequence[Union[str, int]] = WINDOWS,
+                     by: Optional[str] = "category_name_gpt", metrics: Sequence[str] = METRICS) -> pd.DataFrame:
+    """Rolling windows evaluated at the end of every day from the first to the last upload (regular series to plot)."""
+    engine = RollingEngagement(windows, by, metrics)
+    engine.append(dataframe)
+    published_at = pd.to_datetime(dataframe["published_at"], utc=True)
+    days = pd.date_range(published_at.min().normalize(), published_at.max().normalize(), freq="D", tz="UTC")
+    return engine.snapshot(days + pd.Timedelta(days=1) - pd.Timedelta(seconds=1))
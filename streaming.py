@@ -0,0 +1,204 @@
+import argparse
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from data_analysis_time_series import CUBE_SUM_COLUMNS, monthly_category_cube
+from descriptive_analysis import METRICS, print_descriptive_report
+from instrumentation import instrumented
+from loader import type_video_columns, video_csv_dtypes
+from sketches import KLLSketch
+
+ALL_VIDEOS = None  # Sketch key of the statistics over all videos
+DEFAULT_CHUNKSIZE = 200_000
+
+
+def read_video_chunks(path: str, chunksize: int = DEFAULT_CHUNKSIZE, usecols: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Reads a video CSV chunk by chunk, typed like loader.read_videos_csv (only chunksize rows are in memory at a time).
+    Categories stay plain strings here, because every chunk would get its own set of categories.
+    """
+    dtypes = video_csv_dtypes(path, category_dtype="str")
+    if usecols is not None:
+        dtypes = {column: dtype for column, dtype in dtypes.items() if column in usecols}
+    for chunk in pd.read_csv(path, encoding="utf-8", dtype=dtypes, usecols=usecols, chunksize=chunksize):
+        yield type_video_columns(chunk)
+
+def _since_year(chunk: pd.DataFrame, since_year: Optional[int]) -> pd.DataFrame:
+    return chunk if since_year is None else chunk[chunk['published_at'].dt.year >= since_year]
+
+@instrumented
+def top_categories(path: str, top_n: int = 5, since_year: Optional[int] = None, chunksize: int = DEFAULT_CHUNKSIZE) -> pd.Index:
+    """First pass over the file: the top_n most occuring categories, counted chunk by chunk from two columns."""
+    counts = pd.Series(dtype=np.int64)
+    for chunk in read_video_chunks(path, chunksize, usecols=['published_at', 'category_name_gpt']):
+        chunk_counts = _since_year(chunk, since_year)['category_name_gpt'].value_counts()
+        counts = counts.add(chunk_counts, fill_value=0)
+    return counts.sort_values(ascending=False, kind="stable").head(top_n).index
+
+def _chunk_moments(values: pd.DataFrame, keys: Optional[pd.Series] = None) -> pd.DataFrame:
+    """
+    Count, mean, sum of squared deviations (m2), min and max of every metric in one chunk.
+    Indexed by (metric, group) when keys are given, otherwise by metric (all videos).
+    """
+    tables = []
+    for metric in values.columns:
+        column = values[metric].dropna()
+        grouper = keys.reindex(column.index) if keys is not None else np.zeros(len(column), dtype=np.int8)
+        grouped = column.groupby(grouper, sort=False)
+        moments = grouped.agg(['count', 'mean', 'min', 'max'])
+        # Deviations from the chunk mean are small compared to the values, which keeps m2 accurate.
+        moments['m2'] = ((column - grouped.transform('mean')) ** 2).groupby(grouper, sort=False).sum()
+        tables.append(moments)
+    moments = pd.concat(tables, keys=values.columns, names=['metric', 'group'])
+    return moments if keys is not None else moments.droplevel('group')
+
+def merge_moments(left: pd.DataFrame, right: pd.DataFrame) -> pd.DataFrame:
+    """Combines the moments of two chunks with Chan's parallel formula (same result as computing them on all rows)."""
+    left, right = left.align(right, fill_value=0)
+    count = left['count'] + right['count']
+    delta = right['mean'] - left['mean']
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, left['mean'] + delta * right['count'] / count, np.nan)
+        m2 = left['m2'] + right['m2'] + delta ** 2 * left['count'] * right['count'] / count
+    # Groups missing on one side were filled with 0, which must not count as a min or max.
+    minimum = np.fmin(left['min'].where(left['count'] > 0), right['min'].where(right['count'] > 0))
+    maximum = np.fmax(left['max'].where(left['count'] > 0), right['max'].where(right['count'] > 0))
+    return pd.DataFrame({'count': count, 'mean': mean, 'min': minimum, 'max': maximum, 'm2': m2.fillna(0)}, index=left.index)
+
+
+class StreamingReport:
+    """
+    Mergeable partial aggregates for the report of main.py, filled chunk by chunk:
+    - the monthly (category x month) cube used by the time series plots
+    - count, mean, variance, min and max of views, likes and comments for all videos and per category
+    - KLL quantile sketches for the medians and IQRs
+    Reports of separate files or workers can be combined with merge().
+    Mode needs every distinct value, so it is not part of the streaming report.
+    """
+    def __init__(self, by: str = 'category_name_gpt', metrics: Sequence[str] = METRICS, sketch_k: int = 200):
+        self.by = by
+        self.metrics = list(metrics)
+        self.sketch_k = sketch_k
+        self.cube: Optional[pd.DataFrame] = None
+        self.moments: Optional[pd.DataFrame] = None  # All videos, indexed by metric
+        self.category_moments: Optional[pd.DataFrame] = None  # Indexed by (metric, category)
+        self.sketches: Dict[Tuple[Optional[str], str], KLLSketch] = {}
+
+    def _sketch(self, group: Optional[str], metric: str) -> KLLSketch:
+        key = (group, metric)
+        if key not in self.sketches:
+            self.sketches[key] = KLLSketch(self.sketch_k)
+        return self.sketches[key]
+
+    def update_cube(self, chunk: pd.DataFrame) -> None:
+        """Adds one chunk to the monthly cube."""
+        cube = monthly_category_cube(chunk)
+        self.cube = cube if self.cube is None else pd.concat([self.cube, cube]).groupby(level=[0, 1]).sum()
+
+    def update_statistics(self, chunk: pd.DataFrame) -> None:
+        """Adds one chunk to the moments and quantile sketches, per category and for all videos."""
+        values = chunk[self.metrics].astype(np.float64)
+        groups = chunk[self.by]
+        self._merge_moments(_chunk_moments(values), _chunk_moments(values, groups))
+        for metric in self.metrics:
+            self._sketch(ALL_VIDEOS, metric).update(values[metric].to_numpy())
+            for group, group_values in values[metric].groupby(groups, sort=False):
+                self._sketch(group, metric).update(group_values.to_numpy())
+
+    def _merge_moments(self, moments: Optional[pd.DataFrame], category_moments: Optional[pd.DataFrame]) -> None:
+        if moments is not None:
+            self.moments = moments if self.moments is None else merge_moments(self.moments, moments)
+        if category_moments is not None:
+            self.category_moments = category_moments if self.category_moments is None else merge_moments(self.category_moments, category_moments)
+
+    def merge(self, other: "StreamingReport") -> "StreamingReport":
+        """Combines the aggregates of another report (ex: another file or worker) into this one."""
+        if other.cube is not None:
+            self.cube = other.cube if self.cube is None else pd.concat([self.cube, other.cube]).groupby(level=[0, 1]).sum()
+        self._merge_moments(other.moments, other.category_moments)
+        for (group, metric), sketch in other.sketches.items():
+            self._sketch(group, metric).merge(sketch)
+        return self
+
+    def monthly_cube(self) -> pd.DataFrame:
+        """The (category x month) cube, same as monthly_category_cube on the whole file (empty when no chunk was read)."""
+        if self.cube is None:
+            index = pd.MultiIndex.from_arrays([pd.Index([], dtype=str), pd.DatetimeIndex([], dtype="datetime64[us, UTC]")], names=["category_name_gpt", "published_at"])
+            return pd.DataFrame({column: np.empty(0, dtype=np.int64) for column in ["count"] + CUBE_SUM_COLUMNS}, index=index)
+        return self.cube.sort_index()
+
+    def describe(self, by_category: bool = False) -> pd.DataFrame:
+        """
+        The statistics as a tidy DataFrame like descriptive_analysis.describe_metrics (without mode),
+        for all videos, or per category with by_category. Medians and IQRs come from the sketches.
+        """
+        columns = [self.by, 'metric', 'videos', 'count', 'mean', 'median', 'min', 'max', 'range', 'variance', 'std', 'q1', 'q3', 'iqr']
+        empty = pd.DataFrame(columns=['count', 'mean', 'min', 'max', 'm2'])
+        if by_category:
+            moments = (self.category_moments if self.category_moments is not None else empty).rename_axis(['metric', 'group']).reset_index()
+            if moments.empty:
+                # Every chunk was filtered out: no category has videos.
+                return pd.DataFrame(columns=columns)
+        else:
+            # Metrics without any video (every chunk filtered out) get a NaN row with count 0, like describe_metrics.
+            moments = (self.moments if self.moments is not None else empty).reindex(self.metrics)
+            moments['count'] = moments['count'].fillna(0)
+            moments = moments.rename_axis('metric').reset_index().assign(group=ALL_VIDEOS)
+        rows = []
+        for row in moments.itertuples(index=False):
+            q1, median, q3 = self._sketch(row.group, row.metric).quantiles([0.25, 0.5, 0.75])
+            variance = row.m2 / (row.count - 1) if row.count > 1 else np.nan
+            rows.append({self.by: row.group, 'metric': row.metric, 'videos': int(row.count), 'count': int(row.count),
+                         'mean': row.mean, 'median': median, 'min': row.min, 'max': row.max, 'range': row.max - row.min,
+                         'variance': variance, 'std': np.sqrt(variance), 'q1': q1, 'q3': q3, 'iqr': q3 - q1})
+        result = pd.DataFrame(rows)
+        # Same order as describe_metrics: group first, then metrics in the order they were asked for.
+        result['metric_order'] = result['metric'].map({metric: i for i, metric in enumerate(self.metrics)})
+        result = result.sort_values([self.by, 'metric_order'] if by_category else ['metric_order']).drop(columns='metric_order')
+        if not by_category:
+            result = result.drop(columns=self.by)
+        return result.reset_index(drop=True)
+
+
+@instrumented
+def stream_report(path: str, chunksize: int = DEFAULT_CHUNKSIZE, top_n: Optional[int] = 5, since_year: Optional[int] = None,
+                  sketch_k: int = 200) -> StreamingReport:
+    """
+    Builds the report of main.py over a CSV of any size, reading it chunk by chunk with the same filters:
+    optional year cut, top_n most occuring categories (a first pass over two columns), then
+    views > 0, likes > 0 and comments > 100 for the descriptive statistics only.
+    """
+    categories = top_categories(path, top_n, since_year, chunksize) if top_n is not None else None
+    report = StreamingReport(sketch_k=sketch_k)
+    for chunk in read_video_chunks(path, chunksize):
+        chunk = _since_year(chunk, since_year)
+        if categories is not None:
+            chunk = chunk[chunk['category_name_gpt'].isin(categories)]
+        report.update_cube(chunk)
+        # Some videos are premium. That gives 0 views, likes, comments since API does not access views of premium videos.
+        chunk = chunk[(chunk['views'] > 0) & (chunk['likes'] > 0) & (chunk['comments'] > 100)]
+        report.update_statistics(chunk)
+    return report
+
+
+if __name__ == "__main__":
+    """
+    Same time series plots and descriptive report as main.py, for CSVs that do not fit in memory.
+    """
+    from data_analysis_time_series import category_views_gpt, monthly_video_upload_count_category_gpt, monthly_video_length_sum_category_gpt, monthly_likes_sum_category_gpt, monthly_comments_sum_category_gpt
+
+    parser = argparse.ArgumentParser(description="Chunked report over a large video CSV.")
+    parser.add_argument("path", nargs="?", default="pewdiepie_videos_gpt.csv")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--since-year", type=int, default=None, help="only videos published in or after this year (ex: 2022)")
+    parser.add_argument("--top", type=int, default=5, help="number of most occuring categories to keep")
+    args = parser.parse_args()
+
+    report = stream_report(args.path, args.chunksize, args.top, args.since_year)
+    cube = report.monthly_cube()
+    monthly_video_upload_count_category_gpt(None, cube)
+    category_views_gpt(None, cube)
+    monthly_video_length_sum_category_gpt(None, cube)
+    monthly_likes_sum_category_gpt(None, cube)
+    monthly_comments_sum_category_gpt(None, cube)
+    print_descriptive_report(report.describe(), report.describe(by_category=True))
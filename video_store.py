@@ -0,0 +1,262 @@
+import argparse
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+# Aggregates the queries can sum per group. Metric names are checked against this list because
+# column names can not be passed as query parameters.
+METRIC_SQL = {
+    "count": "COUNT(*)",
+    "views": "SUM(views)",
+    "likes": "SUM(likes)",
+    "comments": "SUM(comments)",
+    "duration_minutes": "SUM(duration_seconds / 60)",  # Integer division floors like duration_minutes
+}
+# Same filters as AnalysisContext.filter (plus channel and categories), applied in the same order.
+FILTERS = ("channel", "since_year", "categories", "top_categories", "views_over", "likes_over", "comments_over")
+VIDEO_COLUMNS = ["video_id", "channel", "title", "published_at", "published_year", "published_month", "category_id", "duration",
+                 "duration_seconds", "views", "likes", "comments", "category_name", "category_name_gpt"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    channel TEXT NOT NULL DEFAULT '',
+    title TEXT,
+    published_at TEXT NOT NULL,          -- ISO 8601 in UTC (2025-03-14T17:00:36Z), sorts like the dates
+    published_year INTEGER NOT NULL,
+    published_month TEXT NOT NULL,       -- 2025-03, so monthly group-bys need no date functions
+    category_id TEXT,
+    duration TEXT,
+    duration_seconds INTEGER,
+    views INTEGER,
+    likes INTEGER,
+    comments INTEGER,
+    category_name TEXT,
+    category_name_gpt TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_videos_published_at ON videos (published_at);
+CREATE INDEX IF NOT EXISTS idx_videos_category_published_at ON videos (category_name_gpt, published_at);
+CREATE INDEX IF NOT EXISTS idx_videos_channel_published_at ON videos (channel, published_at);
+"""
+
+# Fetched rows replace the stored ones, except the ChatGPT category which only the stored row may have.
+UPSERT = f"""
+INSERT INTO videos ({", ".join(VIDEO_COLUMNS)}) VALUES ({", ".join("?" for _ in VIDEO_COLUMNS)})
+ON CONFLICT (video_id) DO UPDATE SET
+    {", ".join(f"{column} = excluded.{column}" for column in VIDEO_COLUMNS if column not in ("video_id", "category_name_gpt"))},
+    category_name_gpt = COALESCE(excluded.category_name_gpt, videos.category_name_gpt)
+"""
+
+
+def _nullable(values: pd.Series) -> List[Any]:
+    """Column values as Python objects with None for missing values (what sqlite3 stores as NULL)."""
+    values = values.astype(object)
+    return values.where(values.notna(), None).tolist()
+
+def video_records(dataframe: pd.DataFrame, channel: str = "") -> List[Tuple]:
+    """
+    Rows of a video table (raw CSV strings or the typed table of loader.load_videos) in the order of VIDEO_COLUMNS.
+    published_at is stored as UTC ISO 8601 text with its year and month, duration also as seconds.
+    """
+    published_at = pd.to_datetime(dataframe["published_at"], utc=True, format="ISO8601")
+    if "duration_seconds" in dataframe.columns:
+        duration_seconds = dataframe["duration_seconds"]
+    else:
+        from durations import duration_seconds as parse_seconds
+        duration_seconds = pd.Series(np.floor(parse_seconds(dataframe["duration"])).astype(np.int64), index=dataframe.index)
+    missing = pd.Series(None, index=dataframe.index, dtype=object)
+    columns = {
+        "video_id": dataframe["video_id"].astype(str).tolist(),
+        "channel": [channel] * len(dataframe),
+        "published_at": published_at.dt.strftime("%Y-%m-%dT%H:%M:%SZ").tolist(),
+        "published_year": published_at.dt.year.tolist(),
+        "published_month": published_at.dt.strftime("%Y-%m").tolist(),
+        "duration_seconds": _nullable(duration_seconds),
+    }
+    for column in ("title", "category_id", "duration", "category_name", "category_name_gpt"):
+        columns[column] = _nullable(dataframe[column].astype(str).where(dataframe[column].notna()) if column in dataframe.columns else missing)
+    for column in ("views", "likes", "comments"):
+        values = pd.to_numeric(dataframe[column], errors="coerce").astype("Int64")
+        columns[column] = _nullable(values)
+    return list(zip(*(columns[column] for column in VIDEO_COLUMNS)))
+
+
+class VideoStore:
+    """
+    Local SQLite store of fetched videos (one table for every channel), indexed on video_id, published_at
+    and category_name_gpt. The report aggregates are answered by the database with the filters and group-bys
+    in the query, so only the (small) results are loaded into pandas, not the whole table.
+    Use it as a context manager, or call close().
+    """
+    def __init__(self, path: str = "videos.sqlite"):
+        self.path = path
+        # Pipeline workers may write to the same file, so wait for the lock instead of failing at once.
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> "VideoStore":
+        return self
+
+    def __exit__(self, error_type, error, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @instrumented
+    def upsert(self, dataframe: pd.DataFrame, channel: str = "") -> int:
+        """Inserts videos, or updates them when the video_id is already stored (see UPSERT). Returns the number of rows written."""
+        records = video_records(dataframe, channel)
+        with self.connection:
+            self.connection.executemany(UPSERT, records)
+        return len(records)
+
+    def ingest_csv(self, path: str, channel: str = "", chunksize: int = 200_000) -> int:
+        """Upserts a video CSV (output of data_structuring.py or pipeline.py) chunk by chunk."""
+        from streaming import read_video_chunks
+        return sum(self.upsert(chunk, channel) for chunk in read_video_chunks(path, chunksize))
+
+    def _where(self, filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """
+        WHERE clause and parameters for the filters of main.py: channel, since_year (published in or after),
+        categories (list of category_name_gpt), top_categories (most occuring N categories, counted after the filters above),
+        views_over, likes_over, comments_over (strictly greater than).
+        """
+        unknown = set(filters) - set(FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown filters: {sorted(unknown)}. Use {FILTERS}.")
+        conditions, params = [], []
+        if filters.get("channel") is not None:
+            conditions.append("channel = ?")
+            params.append(filters["channel"])
+        if filters.get("since_year") is not None:
+            # Compared as text so the published_at index is used (the year starts on January 1st, 00:00 UTC).
+            conditions.append("published_at >= ?")
+            params.append(f"{int(filters['since_year']):04d}-01-01T00:00:00Z")
+        if filters.get("categories") is not None:
+            categories = list(filters["categories"])
+            conditions.append(f"category_name_gpt IN ({', '.join('?' for _ in categories)})")
+            params.extend(categories)
+        if filters.get("top_categories") is not None:
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            conditions.append(f"category_name_gpt IN (SELECT category_name_gpt FROM videos {where} "
+                              f"GROUP BY category_name_gpt ORDER BY COUNT(*) DESC, category_name_gpt LIMIT ?)")
+            params = params + params + [int(filters["top_categories"])]  # Outer conditions, then the same ones in the subquery
+        for name in ("views", "likes", "comments"):
+            if filters.get(f"{name}_over") is not None:
+                conditions.append(f"{name} > ?")
+                params.append(filters[f"{name}_over"])
+        return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> pd.DataFrame:
+        """Runs any parameterized SELECT and returns the result as a DataFrame."""
+        return pd.read_sql_query(sql, self.connection, params=list(params))
+
+    @instrumented
+    def monthly_category_cube(self, metrics: Sequence[str] = ("count", "views", "likes", "comments", "duration_minutes"),
+                              **filters: Any) -> pd.DataFrame:
+        """
+        The (category x month) cube of data_analysis_time_series.monthly_category_cube, computed by the database,
+        so it can be passed to the plotting functions as cube=. Index is (category_name_gpt, published_at month end, UTC).
+        """
+        where, params = self._where(filters)
+        selects = ", ".join(f"{METRIC_SQL[metric]} AS {metric}" for metric in _checked(metrics))
+        cube = self.query(f"SELECT category_name_gpt, published_month, {selects} FROM videos {where} "
+                          f"GROUP BY category_name_gpt, published_month ORDER BY category_name_gpt, published_month", params)
+        cube["published_at"] = _month_end(cube.pop("published_month"))
+        return cube.set_index(["category_name_gpt", "published_at"])
+
+    @instrumented
+    def yearly_counts(self, **filters: Any) -> pd.Series:
+        """Number of videos per year, in chronological order (what number_of_videos_per_year draws)."""
+        where, params = self._where(filters)
+        counts = self.query(f"SELECT published_year AS year, COUNT(*) AS count FROM videos {where} GROUP BY published_year ORDER BY published_year", params)
+        return counts.set_index("year")["count"]
+
+    @instrumented
+    def category_counts(self, **filters: Any) -> pd.Series:
+        """Number of videos per category, most videos first (what number_of_videos_per_category_gpt draws)."""
+        where, params = self._where(filters)
+        counts = self.query(f"SELECT category_name_gpt, COUNT(*) AS count FROM videos {where} "
+                            f"GROUP BY category_name_gpt ORDER BY count DESC, category_name_gpt", params)
+        return counts.set_index("category_name_gpt")["count"]
+
+    @instrumented
+    def max_month(self, metric: str = "duration_minutes", **filters: Any) -> pd.DataFrame:
+        """
+        The month with the highest monthly total of a metric for every category
+        (the "Max Month" searches of monthly_video_length_sum_category_gpt and monthly_comments_sum_category_gpt).
+        """
+        where, params = self._where(filters)
+        metric = _checked([metric])[0]
+        result = self.query(f"""
+            WITH monthly AS (
+                SELECT category_name_gpt, published_month, {METRIC_SQL[metric]} AS total FROM videos {where}
+                GROUP BY category_name_gpt, published_month
+            ), ranked AS (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY category_name_gpt ORDER BY total DESC, published_month) AS position FROM monthly
+            )
+            SELECT category_name_gpt, published_month, total AS {metric} FROM ranked WHERE position = 1 ORDER BY category_name_gpt""", params)
+        result["published_at"] = _month_end(result.pop("published_month"))
+        return result[["category_name_gpt", "published_at", metric]]
+
+    @instrumented
+    def videos(self, columns: Optional[Sequence[str]] = None, **filters: Any) -> pd.DataFrame:
+        """
+        Only the videos kept by the filters, typed like loader.load_videos (UTC datetimes, categorical categories,
+        duration_minutes), for the pandas analysis functions (ex: total_descriptive_analysis).
+        """
+        columns = list(columns) if columns is not None else [column for column in VIDEO_COLUMNS if column not in ("published_year", "published_month")]
+        unknown = set(columns) - set(VIDEO_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {sorted(unknown)}.")
+        where, params = self._where(filters)
+        df = self.query(f"SELECT {', '.join(columns)} FROM videos {where} ORDER BY published_at DESC", params)
+        if "published_at" in df.columns:
+            df["published_at"] = pd.to_datetime(df["published_at"], utc=True, format="ISO8601")
+        for column in ("category_name", "category_name_gpt"):
+            if column in df.columns:
+                df[column] = df[column].astype("category")
+        if "duration_seconds" in df.columns:
+            df["duration_minutes"] = df["duration_seconds"] // 60
+        return df
+
+
+def _checked(metrics: Iterable[str]) -> List[str]:
+    metrics = list(metrics)
+    unknown = set(metrics) - set(METRIC_SQL)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {sorted(unknown)}. Use {list(METRIC_SQL)}.")
+    return metrics
+
+def _month_end(months: pd.Series) -> pd.Series:
+    """'2025-03' labels as the month end timestamps monthly_category_cube uses (2025-03-31, UTC)."""
+    return pd.to_datetime(months + "-01", utc=True) + pd.offsets.MonthEnd(0)
+
+
+if __name__ == "__main__":
+    """
+    Loads video CSVs into the store and answers the questions main.py answers by editing code, ex:
+    python video_store.py --ingest pewdiepie_videos_gpt.csv --channel PewDiePie
+    python video_store.py --since-year 2022 --top 5 --max-month comments
+    """
+    parser = argparse.ArgumentParser(description="SQLite store and queries over fetched videos.")
+    parser.add_argument("--db", default="videos.sqlite")
+    parser.add_argument("--ingest", nargs="*", default=[], help="video CSVs to insert or update")
+    parser.add_argument("--channel", default="", help="channel name stored with the ingested videos, and channel filter of the queries")
+    parser.add_argument("--since-year", type=int, default=None)
+    parser.add_argument("--top", type=int, default=None, help="only the most occuring N categories")
+    parser.add_argument("--max-month", choices=list(METRIC_SQL), help="month with the highest total of this metric per category")
+    args = parser.parse_args()
+
+    with VideoStore(args.db) as store:
+        for path in args.ingest:
+            print(f"{path}: {store.ingest_csv(path, args.channel)} videos")
+        filters = {"channel": args.channel or None, "since_year": args.since_year, "top_categories": args.top}
+        print(store.yearly_counts(**filters).to_string())
+        print(store.category_counts(**filters).to_string())
+        if args.max_month:
+            print(store.max_month(args.max_month, **filters).to_string(index=False))